@@ -2,9 +2,10 @@ from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 import pdfplumber
 import os
+import atexit
 from datetime import datetime
 import uuid
-from database import init_db, save_document, get_document, get_all_documents, delete_document, update_document_metadata
+from database import init_db, save_document, get_document, get_all_documents, delete_document, update_document_metadata, close_all_connections
 # Import metadata generator
 try:
     from gen_meta.document_splitter import split_vietnamese_legal_document
@@ -89,8 +90,18 @@ else:
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Định dạng file được phép upload (PDF, TXT, DOCX, MD, v.v.) và thông báo lỗi tương ứng,
+# dựng một lần khi import thay vì mỗi request upload
+ALLOWED_EXTENSIONS = ('.pdf', '.txt', '.docx', '.doc', '.md', '.markdown')
+# Tra cứu thành viên bằng frozenset (hash) thay vì quét tuple; tuple ở trên giữ thứ tự cho thông báo lỗi
+_ALLOWED_EXTENSION_SET = frozenset(ALLOWED_EXTENSIONS)
+_TEXT_EXTENSIONS = frozenset(('.txt', '.md', '.markdown'))
+_UNSUPPORTED_FORMAT_ERROR = f'Định dạng file không được hỗ trợ. Các định dạng được hỗ trợ: {", ".join(ALLOWED_EXTENSIONS)}'
+
 # Khởi tạo database khi start app
 init_db()
+# Đóng các kết nối SQLite còn trong pool khi process thoát
+atexit.register(close_all_connections)
 
 
 def normalize_text(text):
@@ -315,7 +326,7 @@ def extract_text_from_file(filepath, filename):
         return extract_text_from_pdf(filepath)
     
     # Xử lý TXT và các file text
-    elif file_ext in ['.txt', '.md', '.markdown']:
+    elif file_ext in _TEXT_EXTENSIONS:
         try:
             # Thử với encoding UTF-8
             with open(filepath, 'r', encoding='utf-8') as f:
@@ -387,12 +398,11 @@ def upload_pdf():
         return jsonify({'error': 'Không có file được chọn'}), 400
     
     # Hỗ trợ nhiều loại file: PDF, TXT, DOCX, MD, v.v.
-    allowed_extensions = ['.pdf', '.txt', '.docx', '.doc', '.md', '.markdown']
     file_ext = os.path.splitext(file.filename.lower())[1]
     
-    if file_ext not in allowed_extensions:
+    if file_ext not in _ALLOWED_EXTENSION_SET:
         return jsonify({
-            'error': f'Định dạng file không được hỗ trợ. Các định dạng được hỗ trợ: {", ".join(allowed_extensions)}'
+            'error': _UNSUPPORTED_FORMAT_ERROR
         }), 400
     
     # Tạo document_id duy nhất
@@ -1,5 +1,7 @@
 import sqlite3
 import os
+import queue
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Optional, Dict
 
@@ -11,64 +13,138 @@ else:
     # Local development hoặc server thông thường
     DB_PATH = 'documents.db'
 
-def init_db():
-    """Khởi tạo database và tạo bảng nếu chưa tồn tại"""
-    conn = sqlite3.connect(DB_PATH)
+# Pool kết nối dùng lại giữa các lần gọi thay vì sqlite3.connect()/close() mỗi hàm.
+# Flask tạo thread mới cho mỗi request nên không dùng thread-local: kết nối được trả về pool
+# sau mỗi lần dùng (mỗi lúc chỉ một thread giữ một kết nối -> check_same_thread=False an toàn).
+POOL_SIZE = 8
+_pool: "queue.LifoQueue[tuple]" = queue.LifoQueue(maxsize=POOL_SIZE)
+
+
+# Câu lệnh ghi document (cùng một chuỗi SQL mỗi lần -> trúng statement cache của kết nối trong pool)
+_INSERT_DOCUMENT_SQL = '''
+    INSERT OR REPLACE INTO documents 
+    (document_id, filename, filepath, ocr_text, metadata, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def _connect() -> sqlite3.Connection:
+    """Mở kết nối mới tới DB_PATH (UTF-8, row_factory = sqlite3.Row)."""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     # Đảm bảo SQLite sử dụng UTF-8
     conn.execute("PRAGMA encoding = 'UTF-8'")
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS documents (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            document_id TEXT UNIQUE NOT NULL,
-            filename TEXT NOT NULL,
-            filepath TEXT NOT NULL,
-            ocr_text TEXT,
-            metadata TEXT,
-            created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL
-        )
-    ''')
-    
-    # Thêm cột metadata nếu chưa có (migration)
-    try:
-        cursor.execute('ALTER TABLE documents ADD COLUMN metadata TEXT')
-        conn.commit()
-        print("✅ Đã thêm cột metadata vào bảng documents")
-    except sqlite3.OperationalError:
-        # Cột đã tồn tại, không cần làm gì
-        pass
-    
-    conn.commit()
-    conn.close()
-    print(f"✅ Database initialized: {DB_PATH}")
+    # Cấu hình theo kết nối (journal_mode=WAL lưu trong file DB, đặt ở init_db):
+    #   - synchronous=NORMAL: ở chế độ WAL vẫn an toàn khi app crash, bớt fsync mỗi commit
+    #   - temp_store=MEMORY: bảng/chỉ mục tạm (ORDER BY không có index...) nằm trong RAM
+    #   - cache_size âm = KiB: 16MB page cache cho mỗi kết nối (tối đa POOL_SIZE kết nối)
+    #   - busy_timeout: chờ tối đa 5s khi DB đang bị khóa ghi thay vì lỗi "database is locked" ngay
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -16384")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    conn.row_factory = sqlite3.Row
+    return conn
 
 
-def save_document(document_id: str, filename: str, filepath: str, ocr_text: str, metadata: str = None) -> bool:
-    """Lưu document vào database với xử lý encoding UTF-8"""
+@contextmanager
+def get_connection():
+    """
+    Lấy một kết nối từ pool (hoặc mở mới nếu pool rỗng), trả lại pool khi xong.
+    Transaction còn dang dở (lỗi giữa chừng, chưa commit) được rollback trước khi trả về pool.
+    """
+    conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        # Đảm bảo sử dụng UTF-8
-        conn.execute("PRAGMA encoding = 'UTF-8'")
+        while conn is None:
+            path, pooled = _pool.get_nowait()
+            if path == DB_PATH:
+                conn = pooled
+            else:
+                # DB_PATH đã đổi: bỏ kết nối cũ
+                pooled.close()
+    except queue.Empty:
+        conn = _connect()
+    try:
+        yield conn
+    finally:
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            _pool.put_nowait((DB_PATH, conn))
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+
+def close_all_connections():
+    """Đóng mọi kết nối đang nằm trong pool (app.py đăng ký hàm này với atexit khi tắt app)."""
+    while True:
+        try:
+            _, conn = _pool.get_nowait()
+        except queue.Empty:
+            break
+        conn.close()
+
+def init_db():
+    """Khởi tạo database và tạo bảng nếu chưa tồn tại"""
+    with get_connection() as conn:
+        # WAL: người đọc (danh sách / chi tiết document) không bị chặn bởi lần ghi đang diễn ra,
+        # mỗi commit chỉ ghi nối vào file WAL. Chế độ này được lưu trong file DB nên chỉ cần đặt một lần.
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Không bật được WAL, dùng journal mặc định: {e}")
         cursor = conn.cursor()
         
-        # Đảm bảo ocr_text là string và được encode đúng cách
-        if ocr_text and not isinstance(ocr_text, str):
-            ocr_text = str(ocr_text)
-        if metadata and not isinstance(metadata, str):
-            metadata = str(metadata)
-        # SQLite sẽ tự động xử lý UTF-8 nếu text đã là unicode string
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id TEXT UNIQUE NOT NULL,
+                filename TEXT NOT NULL,
+                filepath TEXT NOT NULL,
+                ocr_text TEXT,
+                metadata TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
         
-        now = datetime.now().isoformat()
+        # Index cho get_all_documents (ORDER BY created_at DESC): đọc theo thứ tự index thay vì quét + sắp xếp
+        # cả bảng. document_id đã có index riêng nhờ ràng buộc UNIQUE.
         cursor.execute('''
-            INSERT OR REPLACE INTO documents 
-            (document_id, filename, filepath, ocr_text, metadata, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (document_id, filename, filepath, ocr_text, metadata, now, now))
+            CREATE INDEX IF NOT EXISTS idx_documents_created_at
+            ON documents(created_at DESC)
+        ''')
+        
+        # Thêm cột metadata nếu chưa có (migration)
+        try:
+            cursor.execute('ALTER TABLE documents ADD COLUMN metadata TEXT')
+            conn.commit()
+            print("✅ Đã thêm cột metadata vào bảng documents")
+        except sqlite3.OperationalError:
+            # Cột đã tồn tại, không cần làm gì
+            pass
         
         conn.commit()
-        conn.close()
+    print(f"✅ Database initialized: {DB_PATH}")
+
+
+def save_document(document_id: str, filename: str, filepath: str, ocr_text: str, metadata: str = None) -> bool:
+    """Lưu document vào database với xử lý encoding UTF-8"""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Đảm bảo ocr_text là string và được encode đúng cách
+            if ocr_text and not isinstance(ocr_text, str):
+                ocr_text = str(ocr_text)
+            if metadata and not isinstance(metadata, str):
+                metadata = str(metadata)
+            # SQLite sẽ tự động xử lý UTF-8 nếu text đã là unicode string
+            
+            now = datetime.now().isoformat()
+            cursor.execute(_INSERT_DOCUMENT_SQL,
+                           (document_id, filename, filepath, ocr_text, metadata, now, now))
+            
+            conn.commit()
         return True
     except Exception as e:
         print(f"❌ Lỗi khi lưu document: {e}")
@@ -80,22 +156,20 @@ def save_document(document_id: str, filename: str, filepath: str, ocr_text: str,
 def update_document_metadata(document_id: str, metadata: str) -> bool:
     """Cập nhật metadata cho document"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.execute("PRAGMA encoding = 'UTF-8'")
-        cursor = conn.cursor()
-        
-        if metadata and not isinstance(metadata, str):
-            metadata = str(metadata)
-        
-        now = datetime.now().isoformat()
-        cursor.execute('''
-            UPDATE documents 
-            SET metadata = ?, updated_at = ?
-            WHERE document_id = ?
-        ''', (metadata, now, document_id))
-        
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            
+            if metadata and not isinstance(metadata, str):
+                metadata = str(metadata)
+            
+            now = datetime.now().isoformat()
+            cursor.execute('''
+                UPDATE documents 
+                SET metadata = ?, updated_at = ?
+                WHERE document_id = ?
+            ''', (metadata, now, document_id))
+            
+            conn.commit()
         return True
     except Exception as e:
         print(f"❌ Lỗi khi cập nhật metadata: {e}")
@@ -107,16 +181,14 @@ def update_document_metadata(document_id: str, metadata: str) -> bool:
 def get_document(document_id: str) -> Optional[Dict]:
     """Lấy document từ database theo document_id"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM documents WHERE document_id = ?
-        ''', (document_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT * FROM documents WHERE document_id = ?
+            ''', (document_id,))
+            
+            row = cursor.fetchone()
         
         if row:
             # sqlite3.Row không có method .get(), phải dùng try/except hoặc kiểm tra key
@@ -147,13 +219,11 @@ def get_document(document_id: str) -> Optional[Dict]:
 def get_all_documents() -> list:
     """Lấy tất cả documents"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM documents ORDER BY created_at DESC')
-        rows = cursor.fetchall()
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT * FROM documents ORDER BY created_at DESC')
+            rows = cursor.fetchall()
         
         return [dict(row) for row in rows]
     except Exception as e:
@@ -164,21 +234,21 @@ def get_all_documents() -> list:
 def delete_document(document_id: str) -> tuple:
     """Xóa document từ database theo document_id"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Lấy filepath trước khi xóa để xóa file vật lý
-        cursor.execute('SELECT filepath FROM documents WHERE document_id = ?', (document_id,))
-        row = cursor.fetchone()
-        
-        if row:
-            filepath = row[0]
+        with get_connection() as conn:
+            cursor = conn.cursor()
             
-            # Xóa khỏi database
-            cursor.execute('DELETE FROM documents WHERE document_id = ?', (document_id,))
-            conn.commit()
-            conn.close()
+            # Lấy filepath trước khi xóa để xóa file vật lý
+            cursor.execute('SELECT filepath FROM documents WHERE document_id = ?', (document_id,))
+            row = cursor.fetchone()
             
+            if row:
+                filepath = row[0]
+                
+                # Xóa khỏi database
+                cursor.execute('DELETE FROM documents WHERE document_id = ?', (document_id,))
+                conn.commit()
+        
+        if row:
             # Xóa file vật lý nếu tồn tại
             # Xử lý cả relative path và absolute path
             if filepath:
@@ -203,7 +273,6 @@ def delete_document(document_id: str) -> tuple:
             
             return True, "Đã xóa document thành công"
         else:
-            conn.close()
             return False, "Document không tồn tại"
     except Exception as e:
         print(f"❌ Lỗi khi xóa document: {e}")
@@ -11,6 +11,13 @@ from typing import List, Tuple, Dict, Any
 
 logger = logging.getLogger(__name__)
 
+# Các pattern dùng trong vòng lặp theo dòng, biên dịch một lần khi import
+# Dừng block căn cứ: "QUYẾT ĐỊNH:" (bỏ qua ký tự markdown *, #, **)
+_QD_COLON_PAT = re.compile(r"QUYẾT\s*ĐỊNH\s*:", re.IGNORECASE)
+# Bắt đầu block căn cứ: "Căn cứ" / "Theo đề nghị" bất kỳ đâu trong dòng
+_CAN_CU_START_PAT = re.compile(r"Căn\s*cứ|Theo\s+đề\s+nghị", re.IGNORECASE)
+_WS_RUN_PAT = re.compile(r"\s+")
+
 
 # NOTE: extract_can_cu_block() đã bị thay thế bởi create_can_cu_blocks()
 # Giữ lại để backward compatibility nếu có code cũ đang dùng
@@ -48,16 +55,18 @@ def create_can_cu_blocks(text: str) -> List[Tuple[str, str, Dict[str, Any]]]:
         striped = line.strip()
         
         # Dừng nếu gặp "QUYẾT ĐỊNH" hoặc "Quyết định" (bỏ qua ký tự markdown *, #, **)
-        if re.search(r"(QUYẾT[\s]*ĐỊNH|Quyết[\s]*định)\s*:", striped, re.IGNORECASE):
+        # Pattern bắt buộc có dấu ':' -> dòng không có ':' thì không cần chạy regex
+        if ':' in striped and _QD_COLON_PAT.search(striped):
             break
         
+        # Sau khi đã vào block căn cứ, lấy TẤT CẢ dòng (kể cả trống) cho đến "QUYẾT ĐỊNH"
+        # (không cần dò lại dấu hiệu bắt đầu vì kết quả như nhau)
+        if in_basis_block:
+            legal_basis_lines.append(line.rstrip())  # Giữ nguyên format
         # Dấu hiệu bắt đầu căn cứ (tìm "Căn cứ" hoặc "Theo" bất kỳ đâu trong dòng, bao gồm có dấu *)
-        if re.search(r"Căn\s*cứ|Theo\s+đề\s+nghị", striped, re.IGNORECASE):
+        elif _CAN_CU_START_PAT.search(striped):
             legal_basis_lines.append(line.rstrip())  # Giữ nguyên với strip newline
             in_basis_block = True
-        # Sau khi đã vào block căn cứ, lấy TẤT CẢ dòng (kể cả trống) cho đến "QUYẾT ĐỊNH"
-        elif in_basis_block:
-            legal_basis_lines.append(line.rstrip())  # Giữ nguyên format
         else:
             # Nếu chưa vào block căn cứ thì bỏ qua
             continue
@@ -91,7 +100,7 @@ def _fold_text(s: str) -> str:
     s_no_accent = "".join(ch for ch in s_nfkd if not unicodedata.combining(ch))
     s_low = s_no_accent.lower()
     # nén khoảng trắng cho regex chấm câu lởm khởm
-    s_low = re.sub(r"\s+", " ", s_low)
+    s_low = _WS_RUN_PAT.sub(" ", s_low)
     return s_low
 
 
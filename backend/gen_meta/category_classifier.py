@@ -9,6 +9,7 @@ import os
 import logging
 from typing import List
 from collections import OrderedDict
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +27,19 @@ KEYWORD_MAPPING = OrderedDict({
     "training_and_regulations": ["quy chế", "quy định", "nội quy", "quy tắc"]  # mặc định cuối cùng
 })
 
+# Bộ mapping từ khóa -> category dùng cho classify_by_content() (theo thứ tự ưu tiên)
+CONTENT_KEYWORD_MAPPING = OrderedDict({
+    'postgraduate_training': ['tiến sĩ', 'thạc sĩ', 'sau đại học', 'ts', 'ths'],
+    'admissions': ['tuyển sinh', 'xét tuyển', 'điều kiện dự tuyển'],
+    'finance_and_tuition': ['học phí', 'miễn giảm', 'thu', 'chi', 'quy định phí'],
+    'examination': ['kỳ thi', 'thi cử', 'đánh giá', 'kiểm tra'],
+    'internship': ['thực tập', 'tttn', 'doanh nghiệp', 'internship'],
+    'distance_learning': ['đào tạo từ xa', 'e-learning', 'online', 'qua mạng'],
+    'student_affairs': ['công tác sinh viên', 'khen thưởng', 'kỷ luật', 'học bổng', 'rèn luyện'],
+    'human_resources': ['tổ chức cán bộ', 'nhân sự', 'cbvc'],
+    'academic_affairs': ['phòng đào tạo', 'chương trình học', 'tín chỉ', 'kế hoạch giảng dạy', 'gdtc', 'thể chất', 'quy chế']
+})
+
 DEFAULT_CATEGORY = "training_and_regulations"
 SUPPORTED_EXTENSIONS = ['.pdf', '.docx', '.doc', '.xlsx', '.xls', '.txt', '.md']
 
@@ -92,6 +106,7 @@ def get_available_categories() -> List[str]:
 def classify_by_content(content: str) -> str:
     """
     Phân loại category từ nội dung văn bản sử dụng rule-based matching.
+    Kết quả được cache theo nội dung (cùng một block thường được phân loại lại khi xử lý lại văn bản).
     
     Args:
         content: Nội dung văn bản cần phân loại
@@ -101,24 +116,16 @@ def classify_by_content(content: str) -> str:
     """
     if not content or not isinstance(content, str):
         return DEFAULT_CATEGORY
-    
+    return _classify_content_cached(content)
+
+
+@lru_cache(maxsize=256)
+def _classify_content_cached(content: str) -> str:
+    """Phần xử lý thực sự của classify_by_content() (content đã được kiểm tra là str khác rỗng)."""
     content_lower = content.lower()
     
-    # Mapping từ khóa -> category (theo thứ tự ưu tiên)
-    keyword_mapping = {
-        'postgraduate_training': ['tiến sĩ', 'thạc sĩ', 'sau đại học', 'ts', 'ths'],
-        'admissions': ['tuyển sinh', 'xét tuyển', 'điều kiện dự tuyển'],
-        'finance_and_tuition': ['học phí', 'miễn giảm', 'thu', 'chi', 'quy định phí'],
-        'examination': ['kỳ thi', 'thi cử', 'đánh giá', 'kiểm tra'],
-        'internship': ['thực tập', 'tttn', 'doanh nghiệp', 'internship'],
-        'distance_learning': ['đào tạo từ xa', 'e-learning', 'online', 'qua mạng'],
-        'student_affairs': ['công tác sinh viên', 'khen thưởng', 'kỷ luật', 'học bổng', 'rèn luyện'],
-        'human_resources': ['tổ chức cán bộ', 'nhân sự', 'cbvc'],
-        'academic_affairs': ['phòng đào tạo', 'chương trình học', 'tín chỉ', 'kế hoạch giảng dạy', 'gdtc', 'thể chất', 'quy chế']
-    }
-    
     # Tìm category khớp đầu tiên
-    for category, keywords in keyword_mapping.items():
+    for category, keywords in CONTENT_KEYWORD_MAPPING.items():
         for keyword in keywords:
             if keyword in content_lower:
                 logger.debug(f"Content analysis: '{keyword}' -> '{category}'")
@@ -13,11 +13,13 @@ Implements the exact requirements:
 
 import re
 import os
+import bisect
 import logging
 import unicodedata
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Set, Iterator
 from dataclasses import dataclass
-from datetime import datetime
+from itertools import chain, pairwise
+from datetime import date
 
 # Import LLM service for keyword generation
 from .llm_service import get_llm_service
@@ -35,6 +37,180 @@ from .keyword_generator import KeywordGenerator
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# =========================
+# Regex biên dịch sẵn một lần cho cả process (dùng trong các hàm bên dưới)
+# =========================
+
+# Điểm xuất phát parse Điều (_find_dieu_start_point)
+_RE_PHAM_VI = re.compile(r"Phạm\s+vi\s+điều\s+chỉnh", re.IGNORECASE)
+_RE_DIEU_1 = re.compile(r"Điều\s+1", re.IGNORECASE)
+_RE_NOI_NHAN = re.compile(r"Nơi\s+nhận\s*:", re.IGNORECASE)
+_RE_KY = re.compile(r"\(Ký\b|Ký\s+.*đóng\s+dấu|Ký\s+và\s+đóng\s+dấu", re.IGNORECASE)
+_RE_QUY_DINH_HEAD = re.compile(r"^##\s+QUY\s+ĐỊNH", re.IGNORECASE)
+_RE_NHUNG_QUY_DINH_CHUNG = re.compile(r"NHỮNG\s+QUY\s+ĐỊNH\s+CHUNG", re.IGNORECASE)
+# Hợp của tất cả dấu hiệu trên (kể cả separator "***"), dùng để loại nhanh các dòng không liên quan
+_RE_START_ANY = re.compile(
+    r"Phạm\s+vi\s+điều\s+chỉnh|Nơi\s+nhận\s*:|\(Ký\b|Ký\s+.*đóng\s+dấu|Ký\s+và\s+đóng\s+dấu"
+    r"|^\*\*\*|^##\s+QUY\s+ĐỊNH|NHỮNG\s+QUY\s+ĐỊNH\s+CHUNG",
+    re.IGNORECASE,
+)
+# Ký tự đầu (của dòng đã strip) của mọi dòng ranh giới/bỏ qua/mở đầu Điều trong _index_lines:
+# **, #, đường kẻ _ = -, Điều/Dieu, Chương, Phụ lục, Nơi nhận. Dòng "... # Chương" được xét riêng qua '#'.
+_BOUNDARY_LEAD_CHARS = frozenset('*#_=-ĐđDdCcPpNn')
+
+# Số hiệu văn bản - các pattern dự phòng (_extract_document_metadata), gộp thành một alternation.
+# Mỗi nhánh nằm trong lookahead (không tiêu thụ ký tự) nên finditer báo MỌI vị trí có nhánh khớp,
+# tại mỗi vị trí là nhánh ưu tiên cao nhất -> chọn lại được đúng thứ tự ưu tiên như khi search từng pattern.
+_RE_DOC_ID_FALLBACK = re.compile(
+    r'(?=(?P<qd>\d+\/QĐ-[A-ZĐƠƯ&]+)'                       # 1893/QĐ-ĐHTN
+    r'|(?P<tt>\d+\/\d+\/TT-[A-ZĐƠƯ&]+)'                     # 48/2020/TT-BGDĐT
+    r'|(?P<nd>\d+\/\d+\/NĐ-CP)'                             # 11/2015/NĐ-CP
+    r'|(?P<nq>\d+\/NQ-[A-ZĐƠƯ&]+)'                          # 15/NQ-HĐT
+    r'|(?P<qdtt>QD-DHCNTT[&]?TT)'
+    r'|(?P<num>\d+[\/\-]\d+[\/\-]?\d*[\/\-]?[A-ZĐƠƯ\-&]*))',  # số chung (cuối cùng)
+    re.IGNORECASE,
+)
+# Các nhánh được đánh số group theo đúng thứ tự ưu tiên (group 1 = qd ... group 6 = num),
+# nên m.lastindex chính là thứ hạng ưu tiên của nhánh khớp (không nhánh nào có group lồng bên trong).
+
+# Chữ hoa tiếng Việt (dựng sẵn, NFC) dùng trong character class của regex
+_VN_UPPER = 'A-ZÀÁẢÃẠÂẦẤẨẪẬĂẰẮẲẴẶÈÉẺẼẸÊỀẾỂỄỆÌÍỈĨỊÒÓỎÕỌÔỒỐỔỖỘƠỜỚỞỠỢÙÚỦŨỤƯỪỨỬỮỰỲÝỶỸỴĐ'
+
+# Ranh giới Điều/Chương/Phụ lục/Nơi nhận dùng trong các vòng lặp theo dòng
+# (_classify_boundary_line, _extract_article_from_position), truy cập qua self._boundary
+_BOUNDARY = {
+    # Dòng cần bỏ qua khi gom nội dung Điều (heading, Chương, đường kẻ)
+    # (heading markdown '^#+\s*' chỉ cần dòng bắt đầu bằng '#' -> kiểm tra bằng startswith, không dùng regex)
+    # (IGNORECASE đã bao gồm cả "CHƯƠNG" lẫn "Chương", không cần alternation)
+    'heading_chuong': re.compile(r'#+\s*Chương', re.IGNORECASE),
+    'bold_chuong_prefix': re.compile(r'^\s*\*\*Chương', re.IGNORECASE),
+    'chuong_title': re.compile(r'^\s*Chương\s+[IVXLC\d]+', re.IGNORECASE),
+    'caps_title': re.compile(rf'^[{_VN_UPPER}\s,.;:!\?]+$'),
+
+    # Dòng mở đầu Điều, gộp 3 dạng vào một alternation (thứ tự ưu tiên giữ nguyên):
+    #   **Điều N. Tiêu đề**  -> num_b / title_b
+    #   **Điều N. Tiêu đề    |  Điều N. Tiêu đề  -> num / title
+    'article_head': re.compile(
+        r'^\s*(?:\*\*(?:Điều|Dieu)\s+(?P<num_b>\d+)\s*[—\-\.]?\s*(?P<title_b>.*?)\*\*'
+        r'|(?:\*\*)?(?:Điều|Dieu)\s+(?P<num>\d+)\s*\.?\s*(?P<title>.*?)$)',
+        re.IGNORECASE),
+
+    # Phân loại dòng cho _classify_boundary_line (dùng .match, mọi nhánh đều neo đầu dòng):
+    #   'skip_any' = heading '#' | **Chương ... | Chương <số>   (đường kẻ: xem _is_separator)
+    #   'stop_any' = [**]Điều <số> | [**]Chương <số> | [**]Phụ lục <số> | Nơi nhận
+    'skip_any': re.compile(r'#|\s*(?i:\*\*Chương\s+|Chương\s+[IVXLC\d]+)'),
+    'stop_any': re.compile(
+        r'\s*(?:(?:\*\*)?(?:Điều\s+\d+|Chương\s+[IVXLC\d]+|Phụ\s+lục\s+\d+)|Nơi\s+nhận)',
+        re.IGNORECASE),
+}
+
+# Dựng 'source' của block theo section_type (_create_block_metadata): tra dict thay vì chuỗi if/elif
+def _source_khoan(si: Dict[str, Any]) -> str:
+    # Format: Điều X, Khoản Y (theo test.md)
+    return f"Điều {si.get('article_num', '')}, Khoản {si.get('khoan_num', '')}"
+
+def _source_clause_or_article(si: Dict[str, Any]) -> str:
+    # giữ Điều/Khoản nếu có, còn lại fallback Điều X
+    clause_num = si.get('clause_num', '')
+    return f"Điều {si.get('article_num', '')}" + (f", Khoản {clause_num}" if clause_num else "")
+
+_SOURCE_BUILDERS = {
+    'legal_basis': lambda si: "Căn cứ",
+    'quyet_dinh': lambda si: "Quyết định",
+    'article': lambda si: f"Điều {si.get('article_num', '')}",
+    'khoan': _source_khoan,
+    # subsection = numbered 1., 2., ... nhưng khác nhánh 'khoan'
+    'subsection': lambda si: f"Điều {si.get('article_num', '')}, Khoản {si.get('subsection_num', '')}",
+    # Format: Điều X, Khoản Y, Điểm Z (theo test.md)
+    'point': lambda si: (f"Điều {si.get('article_num', '')}, "
+                         f"Khoản {si.get('clause_num', '') or si.get('khoan_num', '')}, "
+                         f"Điểm {si.get('point_letter', '')}"),
+    'nhu_sau_clause': _source_clause_or_article,
+    'nhu_sau_article': _source_clause_or_article,
+    'quy_trinh_clause': _source_clause_or_article,
+    'quy_trinh_article': _source_clause_or_article,
+    # Format: Chương X — tiêu đề
+    'chuong': lambda si: si.get('source', ''),
+    # Format: Phụ lục X
+    'phu_luc': lambda si: f"Phụ lục {si.get('phu_luc_num', '')}",
+}
+
+# Dòng phân cách giữa các block trong to_markdown: trước Điều mới thêm 2 dòng trống, block khác 1 dòng
+_DIEU_SEP = ("", "", "---", "")
+_OTHER_SEP = ("", "---", "")
+
+# Khối Metadata + Nội dung cho các block thường trong to_markdown
+_BLOCK_TEMPLATE = (
+    "## Metadata\n"
+    "- **doc_id:** {doc_id}\n"
+    "- **department:** {department}\n"
+    "- **type_data:** {type_data}\n"
+    "- **category:** {category}\n"
+    "- **date:** {date}\n"
+    "- **source:** {source}\n"
+    "\n"
+    "## Nội dung\n"
+    "\n"
+    "{content}"
+)
+
+# Khoản đánh số "1. ...", "2. ..." trong nội dung một Điều (_split_article_by_khoan)
+# (chỉ cần số khoản và vị trí bắt đầu; '.*' giữ nguyên điểm kết thúc match như bản có '(.*)$')
+_RE_KHOAN = re.compile(r'(?m)^\s*([0-9]+)\.\s+.*')
+
+# "Khoản n của Điều X" -> (n, X) (_create_block_metadata, nhánh khoan_number_clause)
+_RE_KHOAN_OF_DIEU = re.compile(r'Khoản\s+(\d+).*?Điều\s+(\d+)')
+
+# Tiêu đề văn bản / tiêu đề Điều (_extract_document_title_from_blocks, _create_title_for_block)
+_RE_DIEU_1_HEAD = re.compile(r'Điều\s*1[.:]', re.IGNORECASE)
+_RE_QUOTED = re.compile(r'["""]([^"""]+)["""]')
+_RE_ARTICLE_TITLE = re.compile(r'(?:\*\*)?Điều\s+\d+\.\s*(.+?)(?:\s*\*\*)?$', re.IGNORECASE)
+_RE_TRAILING_PUNCT = re.compile(r'[,;\.]$')
+
+# Nguồn trích từ nội dung đã lower() (_extract_source_from_content)
+_RE_SRC_DIEU = re.compile(r'điều\s+(\d+)')
+_RE_SRC_PHU_LUC = re.compile(r'phụ\s+lục\s+(\d+)')
+
+# Ký tự tạo đường kẻ phân cách (_is_separator)
+_SEP_CHARS = frozenset('_=-')
+
+def _is_separator(s: str) -> bool:
+    """
+    Dòng (đã strip) là đường kẻ: '_____' (>= 5 ký tự), '===...' hoặc '---...'.
+    Tương đương regex ^_{5,}$|^=+$|^\-+$ nhưng chỉ dùng so sánh chuỗi (str.count chạy trong C).
+    """
+    return (bool(s) and s[0] in _SEP_CHARS and s.count(s[0]) == len(s)
+            and (s[0] != '_' or len(s) >= 5))
+
+_bold_chuong_prefix_search = _BOUNDARY['bold_chuong_prefix'].search
+_caps_title_match = _BOUNDARY['caps_title'].match
+
+def _should_skip_clean_line(stripped: str) -> bool:
+    """
+    Dòng (đã strip) cần loại khỏi nội dung Điều: tiền tố **Chương, hoặc tiêu đề chương viết hoa (> 20 ký tự).
+    """
+    # Allow punctuation and Vietnamese accents
+    return bool(_bold_chuong_prefix_search(stripped) or
+                (len(stripped) > 20 and _caps_title_match(stripped)))
+
+def _format_date(day: str, month: str, year: str) -> str:
+    """
+    Chuẩn hóa ngày (chuỗi số trích từ regex) về dạng yyyy-mm-dd, trả về "" nếu ngày không hợp lệ.
+    date() chỉ dùng để kiểm tra hợp lệ (ngày 30/02, tháng 13...), chuỗi kết quả ghép trực tiếp
+    thay vì strftime.
+    """
+    # Ensure year is 4 digits
+    year_int = int(year)
+    if year_int < 100:  # Convert 2-digit year to 4-digit
+        year_int += 2000 if year_int < 50 else 1900
+    month_int, day_int = int(month), int(day)
+    try:
+        date(year_int, month_int, day_int)
+    except ValueError:
+        return ""
+    # strftime('%Y') không thêm số 0 ở đầu cho năm < 1000 -> giữ nguyên như vậy
+    return f"{year_int}-{month_int:02d}-{day_int:02d}"
+
 # =========================
 # Helper functions for folding and finding spans
 # =========================
@@ -157,6 +333,23 @@ class EnhancedVnLegalSplitter:
             # Nhận diện footer
             'footer': re.compile(r'^(Nơi nhận|KT\.\s*HIỆU TRƯỞNG|HIỆU TRƯỞNG)', re.MULTILINE | re.IGNORECASE),
         }
+
+        # Gắn các regex ranh giới (Điều/Chương/Phụ lục/Nơi nhận, biên dịch sẵn ở mức module) dùng trong các vòng lặp theo dòng
+        self._bind_boundary_patterns()
+
+    def _bind_boundary_patterns(self) -> None:
+        """
+        Gắn các regex nhận diện ranh giới (đã biên dịch một lần ở mức module, _BOUNDARY) vào instance
+        cho _classify_boundary_line / _extract_article_from_position; không biên dịch gì ở đây.
+        """
+        self._boundary = _BOUNDARY
+
+        # Gán sẵn các bound method dùng trong _classify_boundary_line (gọi cho từng dòng),
+        # tránh tra dict + thuộc tính mỗi lần gọi
+        b = self._boundary
+        self._skip_match = b['skip_any'].match
+        self._heading_chuong_search = b['heading_chuong'].search
+        self._stop_match = b['stop_any'].match
     # Hàm này dùng để tách một văn bản pháp lý thành các block theo hệ thống phân cấp (như Điều, Khoản, Chương...) của pháp luật Việt Nam.
     # Kết quả trả về là một danh sách các đối tượng LegalBlock, mỗi block chứa metadata, loại, nguồn, nội dung được chuẩn hóa để sử dụng về sau.
     def split_document(self, text: str, filename: str = "") -> List[LegalBlock]:
@@ -186,21 +379,25 @@ class EnhancedVnLegalSplitter:
         can_cu_blocks = create_can_cu_blocks(text)
         qd_content = extract_quyet_dinh_block(text)
         
-        # Tách văn bản thành các phần theo hệ cấp (Điều, Khoản, Chương, v.v.)
-        sections = self._split_by_hierarchy(text)
-        
         # Tạo list sections với Căn cứ và Quyết định ở đầu
-        all_sections = []
+        head_sections = []
         if can_cu_blocks:
-            all_sections.extend(can_cu_blocks)
+            head_sections.extend(can_cu_blocks)
         if qd_content and qd_content.strip():
-            all_sections.append(('quyet_dinh', qd_content, {'name': 'Quyết định'}))
-        all_sections.extend(sections)
+            head_sections.append(('quyet_dinh', qd_content, {'name': 'Quyết định'}))
         
-        logger.info(f"Document split: {len(can_cu_blocks)} Căn cứ blocks, 1 Quyết định, {len(sections)} Điều/Khoản")
+        # Tách văn bản thành các phần theo hệ cấp (Điều, Khoản, Chương, v.v.)
+        # Dùng generator: mỗi Điều/Khoản được xử lý ngay khi tách xong
+        # Tách dòng một lần cho cả văn bản, dùng chung cho các bước tách theo dòng
+        lines = text.split('\n')
+        all_sections = chain(head_sections, self._iter_hierarchy(text, lines))
+        n_sections = 0
 
         for idx, (section_type, section_content, section_info) in enumerate(all_sections):
-            if not section_content.strip():
+            n_sections += 1
+            # Strip một lần, dùng lại cho bước chuẩn hóa nội dung bên dưới
+            stripped_content = section_content.strip()
+            if not stripped_content:
                 continue
 
             # Tạo metadata riêng cho block này dựa trên phân cấp và nội dung
@@ -212,7 +409,7 @@ class EnhancedVnLegalSplitter:
             metadata['category'] = classify_by_content(section_content)
 
             # Chuẩn hóa nội dung để tạo ra block sạch
-            standardized_content = self._create_standardized_content(section_content.strip(), metadata['source'])
+            standardized_content = self._create_standardized_content(stripped_content, metadata['source'])
 
             # Tạo LegalBlock
             block = LegalBlock(
@@ -227,6 +424,7 @@ class EnhancedVnLegalSplitter:
             
             blocks.append(block)
 
+        logger.info(f"Document split: {len(can_cu_blocks)} Căn cứ blocks, 1 Quyết định, {n_sections - len(head_sections)} Điều/Khoản")
         logger.info(f"Document processed: {len(blocks)} blocks created")
         return blocks
 
@@ -236,74 +434,34 @@ class EnhancedVnLegalSplitter:
         doc_id = ""
         
         # Pattern 1: "Số: 429/QĐ-ĐHCNT&TT" - format chuẩn nhất, chỉ tìm ở đầu văn bản
-        doc_id_match = self.patterns['doc_id'].search(text[:2000])  # Chỉ tìm trong 2000 ký tự đầu
+        # Chỉ tìm trong 2000 ký tự đầu (endpos: như thể chuỗi kết thúc tại đó, không cần cắt text[:2000])
+        doc_id_match = self.patterns['doc_id'].search(text, 0, 2000)
         if doc_id_match:
             doc_id = doc_id_match.group(1).strip()
         
-        # Pattern 2: Format: số/QĐ-cơ quan (ví dụ: 1893/QĐ-ĐHTN)
+        # Pattern 2-7 (fallback): QĐ, TT, NĐ-CP, NQ, QD-DHCNTT&TT, số chung - theo thứ tự ưu tiên.
+        # Một lượt finditer thay cho tối đa 6 lần search cả văn bản; nhánh ưu tiên cao hơn
+        # luôn thắng, cùng nhánh thì lấy vị trí sớm nhất (giống search từng pattern lần lượt).
         if not doc_id:
-            qd_pattern = re.search(r'(\d+\/QĐ-[A-ZĐƠƯ&]+)', text, re.IGNORECASE)
-            if qd_pattern:
-                doc_id = qd_pattern.group(1)
-        
-        # Pattern 3: Format: số/TT-cơ quan (ví dụ: 48/2020/TT-BGDĐT)
-        if not doc_id:
-            tt_pattern = re.search(r'(\d+\/\d+\/TT-[A-ZĐƠƯ&]+)', text, re.IGNORECASE)
-            if tt_pattern:
-                doc_id = tt_pattern.group(1)
-        
-        # Pattern 4: Format: số/NĐ-CP (ví dụ: 11/2015/NĐ-CP)
-        if not doc_id:
-            nd_pattern = re.search(r'(\d+\/\d+\/NĐ-CP)', text, re.IGNORECASE)
-            if nd_pattern:
-                doc_id = nd_pattern.group(1)
-        
-        # Pattern 5: Format: số/NQ-HĐT (ví dụ: 15/NQ-HĐT)
-        if not doc_id:
-            nq_pattern = re.search(r'(\d+\/NQ-[A-ZĐƠƯ&]+)', text, re.IGNORECASE)
-            if nq_pattern:
-                doc_id = nq_pattern.group(1)
-        
-        # Pattern 6: QD-DHCNTT&TT pattern (fallback)
-        if not doc_id:
-            qd_match = re.search(r'(QD-DHCNTT[&]?TT)', text, re.IGNORECASE)
-            if qd_match:
-                doc_id = qd_match.group(1)
-        
-        # Pattern 7: General number patterns (last resort)
-        if not doc_id:
-            number_match = re.search(r'(\d+[\/\-]\d+[\/\-]?\d*[\/\-]?[A-ZĐƠƯ\-&]*)', text, re.IGNORECASE)
-            if number_match:
-                doc_id = number_match.group(1)
+            best_rank = _RE_DOC_ID_FALLBACK.groups + 1
+            for m in _RE_DOC_ID_FALLBACK.finditer(text):
+                rank = m.lastindex
+                if rank < best_rank:
+                    best_rank, doc_id = rank, m.group(rank)
+                    if rank == 1:
+                        break
         
         # Extract date with yyyy-mm-dd format (4 digits year)
         date_str = ""
         date_match = self.patterns['date_location'].search(text)
         if date_match:
             _, day, month, year = date_match.groups()
-            try:
-                # Ensure year is 4 digits
-                year_int = int(year)
-                if year_int < 100:  # Convert 2-digit year to 4-digit
-                    year_int += 2000 if year_int < 50 else 1900
-                date_obj = datetime(year_int, int(month), int(day))
-                date_str = date_obj.strftime('%Y-%m-%d')  # yyyy-mm-dd format
-            except ValueError:
-                pass
+            date_str = _format_date(day, month, year)
         
         if not date_str:
             simple_date_match = self.patterns['date_simple'].search(text)
             if simple_date_match:
-                day, month, year = simple_date_match.groups()
-                try:
-                    # Ensure year is 4 digits
-                    year_int = int(year)
-                    if year_int < 100:  # Convert 2-digit year to 4-digit
-                        year_int += 2000 if year_int < 50 else 1900
-                    date_obj = datetime(year_int, int(month), int(day))
-                    date_str = date_obj.strftime('%Y-%m-%d')  # yyyy-mm-dd format
-                except ValueError:
-                    pass
+                date_str = _format_date(*simple_date_match.groups())
         
         return {
             'doc_id': doc_id,
@@ -336,16 +494,16 @@ class EnhancedVnLegalSplitter:
         # Ưu tiên tìm từ block "Quyết định"
         for block in blocks:
             if block.source == "Quyết định":
-                lines = block.content.split('\n')[:20]
+                lines = block.content.split('\n', 20)[:20]
                 for line in lines:
-                    if re.search(r'Điều\s*1[.:]', line, re.IGNORECASE):
-                        quoted_match = re.search(r'["""]([^"""]+)["""]', line)
+                    if _RE_DIEU_1_HEAD.search(line):
+                        quoted_match = _RE_QUOTED.search(line)
                         if quoted_match:
                             return quoted_match.group(1).strip()
         
         # Thử lấy từ block đầu tiên
         if blocks and blocks[0].content:
-            lines = blocks[0].content.split('\n')[:10]
+            lines = blocks[0].content.split('\n', 10)[:10]
             for line in lines:
                 line = line.strip()
                 if line and len(line) > 10 and len(line) < 200:
@@ -365,9 +523,9 @@ class EnhancedVnLegalSplitter:
             if source == "Quyết định":
                 # Look for Điều 1 which contains the regulation name in quotes
                 for line in lines[:50]:  # Check first 50 lines to find Điều 1
-                    if re.search(r'Điều\s*1[.:]', line, re.IGNORECASE):
+                    if _RE_DIEU_1_HEAD.search(line):
                         # Extract quoted text
-                        quoted_match = re.search(r'["""]([^"""]+)["""]', line)
+                        quoted_match = _RE_QUOTED.search(line)
                         if quoted_match:
                             document_title = quoted_match.group(1)
                             break
@@ -402,19 +560,6 @@ class EnhancedVnLegalSplitter:
             # Only call if we have a real document title, not "Căn cứ"
             keyword = self._get_document_keyword(document_title) if document_title else ""
             
-            # SPECIAL CASE: For "Điều" source, extract article title from content first
-            article_title_for_llm = document_title
-            if source.startswith("Điều"):
-                article_num = source.split()[1] if len(source.split()) > 1 else ""
-                # Look for "Điều X. Title" pattern in content
-                for line in lines[:5]:
-                    line_stripped = line.strip()
-                    title_match = re.search(r'(?:\*\*)?Điều\s+\d+\.\s*(.+?)(?:\s*\*\*)?$', line_stripped, re.IGNORECASE)
-                    if title_match:
-                        article_title_for_llm = title_match.group(1).strip()
-                        article_title_for_llm = re.sub(r'[,;\.]$', '', article_title_for_llm).strip()
-                        break
-            
             # Fallback: create title based on source type
             # Nếu có keyword thì thêm "liên quan đến {keyword}", không thì bỏ
             suffix = f" liên quan đến {keyword}" if keyword else ""
@@ -439,11 +584,11 @@ class EnhancedVnLegalSplitter:
                 for line in lines[:5]:  # Check first 5 lines
                     line_stripped = line.strip()
                     # Match patterns like: "Điều 1. Title" or "**Điều 1. Title**"
-                    title_match = re.search(r'(?:\*\*)?Điều\s+\d+\.\s*(.+?)(?:\s*\*\*)?$', line_stripped, re.IGNORECASE)
+                    title_match = _RE_ARTICLE_TITLE.search(line_stripped)
                     if title_match:
                         article_title = title_match.group(1).strip()
                         # Clean up common endings
-                        article_title = re.sub(r'[,;\.]$', '', article_title).strip()
+                        article_title = _RE_TRAILING_PUNCT.sub('', article_title).strip()
                         break
                 
                 # Default: Use full article title
@@ -493,20 +638,18 @@ class EnhancedVnLegalSplitter:
             return "Căn cứ"
         elif 'điều' in content_lower:
             # Extract article number - highest priority
-            article_match = re.search(r'điều\s+(\d+)', content_lower)
+            article_match = _RE_SRC_DIEU.search(content_lower)
             if article_match:
                 return f"Điều {article_match.group(1)}"
         elif 'quyết định' in content_lower and 'ban hành' in content_lower:
             return "Quyết định"
         elif 'khoản' in content_lower:
-            # Extract article and clause numbers
-            article_match = re.search(r'điều\s+(\d+)', content_lower)
-            khoan_match = re.search(r'khoản\s+(\d+)', content_lower)
-            if article_match and khoan_match:
-                return f"Điều {article_match.group(1)}, Khoản {khoan_match.group(1)}"
+            # Tới nhánh này thì nội dung không chứa 'điều' (đã bắt ở nhánh trên)
+            # -> không thể ghép "Điều X, Khoản Y", không cần chạy regex
+            return ""
         elif 'phụ lục' in content_lower:
             # Extract appendix number
-            appendix_match = re.search(r'phụ\s+lục\s+(\d+)', content_lower)
+            appendix_match = _RE_SRC_PHU_LUC.search(content_lower)
             if appendix_match:
                 return f"Phụ lục {appendix_match.group(1)}"
         
@@ -527,7 +670,8 @@ class EnhancedVnLegalSplitter:
         t = title.strip().lower()
         return "đối tượng áp dụng" in t and "phạm vi điều chỉnh" not in t
 
-    def _find_dieu_start_point(self, text: str) -> Optional[int]:
+    def _find_dieu_start_point(self, text: str, lines: Optional[List[str]] = None,
+                               stripped_lines: Optional[List[str]] = None) -> Optional[int]:
         """
         Tìm điểm xuất phát để bắt đầu parse các Điều.
         Các dấu hiệu:
@@ -535,75 +679,101 @@ class EnhancedVnLegalSplitter:
         2. Tìm sau "Nơi nhận" -> "Ký" -> separator "***" -> "## QUY ĐỊNH"
         3. Tìm "NHỮNG QUY ĐỊNH CHUNG"
         4. Tìm "## QUY ĐỊNH" trực tiếp
+        
+        lines: text.split('\n') nếu caller đã tách sẵn (tránh tách lại cả văn bản)
+        stripped_lines: [ln.strip() for ln in lines] nếu caller đã tính sẵn
         """
-        lines = text.split('\n')
+        if stripped_lines is None:
+            if lines is None:
+                lines = text.split('\n')
+            stripped_lines = [ln.strip() for ln in lines]
         
-        # Bước 1: Tìm "Phạm vi điều chỉnh" (Ưu tiên cao nhất)
-        for i, line in enumerate(lines):
-            striped = line.strip()
-            if re.search(r"Phạm\s+vi\s+điều\s+chỉnh", striped, re.IGNORECASE):
+        # Quét MỘT lượt, ghi lại vị trí các dấu hiệu; sau đó xét theo thứ tự ưu tiên bên dưới.
+        # _RE_START_ANY là điều kiện cần của mọi dấu hiệu -> dòng không khớp thì bỏ qua ngay.
+        # Trước regex còn lọc bằng substring trên line.lower(): mỗi dấu hiệu (trừ "***") chứa một trong
+        # 'phạm'/'nhận'/'ký'/'quy'. Các từ này không có chữ 'i' nên vẫn là điều kiện cần chính xác
+        # (IGNORECASE khớp 'i' với cả 'İ'/'ı' nhưng lower() của chúng không ra 'i').
+        any_marker = _RE_START_ANY.search
+        noi_nhan_line = None
+        nhung_quy_dinh_line = None
+        ky_lines: List[int] = []
+        star_lines: List[int] = []
+        quy_dinh_lines: List[int] = []
+        for i, striped in enumerate(stripped_lines):
+            if not striped:
+                continue
+            low = striped.lower()
+            if not ('phạm' in low or 'nhận' in low or 'ký' in low or 'quy' in low
+                    or striped.startswith('***')):
+                continue
+            if not any_marker(striped):
+                continue
+            
+            # Bước 1: "Phạm vi điều chỉnh" (Ưu tiên cao nhất) - gặp lần đầu là trả về luôn
+            if _RE_PHAM_VI.search(striped):
                 # Kiểm tra xem có phải là Điều 1 không
                 # Tìm dòng Điều gần nhất trước "Phạm vi điều chỉnh"
-                for j in range(i - 5, i + 1):  # Kiểm tra 5 dòng trước
-                    if j < 0:
-                        continue
-                    stripped_j = lines[j].strip()
-                    if re.search(r"Điều\s+1", stripped_j, re.IGNORECASE):
+                for j in range(max(i - 5, 0), i + 1):  # Kiểm tra 5 dòng trước
+                    if _RE_DIEU_1.search(stripped_lines[j]):
                         return j
                 # Nếu không tìm thấy Điều 1 trước đó, trả về dòng hiện tại
                 return i
-        
-        # Bước 2: Tìm "Nơi nhận"
-        noi_nhan_line = None
-        for i, line in enumerate(lines):
-            striped = line.strip()
-            if re.search(r"Nơi\s+nhận\s*:", striped, re.IGNORECASE):
+            
+            if noi_nhan_line is None and _RE_NOI_NHAN.search(striped):
                 noi_nhan_line = i
-                break
+            if _RE_KY.search(striped):
+                ky_lines.append(i)
+            if striped.startswith('***'):
+                star_lines.append(i)
+            if _RE_QUY_DINH_HEAD.search(striped):
+                quy_dinh_lines.append(i)
+            if nhung_quy_dinh_line is None and _RE_NHUNG_QUY_DINH_CHUNG.search(striped):
+                nhung_quy_dinh_line = i
         
-        # Bước 3: Tìm "Ký" sau "Nơi nhận"
+        # Bước 2 + 3: "Nơi nhận" -> "Ký" đầu tiên sau đó
         if noi_nhan_line is not None:
-            for i in range(noi_nhan_line + 1, len(lines)):
-                striped = lines[i].strip()
-                if re.search(r"\(Ký\b|Ký\s+.*đóng\s+dấu|Ký\s+và\s+đóng\s+dấu", striped, re.IGNORECASE):
-                    # Tìm separator "***" sau Ký
-                    for j in range(i + 1, len(lines)):
-                        stripped = lines[j].strip()
-                        if re.search(r"^\*\*\*", stripped):
-                            # Tìm "## QUY ĐỊNH" sau separator
-                            for k in range(j + 1, len(lines)):
-                                stripped2 = lines[k].strip()
-                                if re.search(r"^##\s+QUY\s+ĐỊNH", stripped2, re.IGNORECASE):
-                                    # Điểm xuất phát là sau dòng ## QUY ĐỊNH (có thể là Chương hoặc Điều)
-                                    return k + 1
-                            return j + 2  # Trả về sau separator
-                    return i + 3  # Trả về sau Ký
-        
-        # Bước 4: Tìm trực tiếp "NHỮNG QUY ĐỊNH CHUNG"
-        for i, line in enumerate(lines):
-            striped = line.strip()
-            if re.search(r"NHỮNG\s+QUY\s+ĐỊNH\s+CHUNG", striped, re.IGNORECASE):
-                return i + 1
-        
-        # Bước 5: Tìm trực tiếp "## QUY ĐỊNH"
-        for i, line in enumerate(lines):
-            striped = line.strip()
-            if re.search(r"^##\s+QUY\s+ĐỊNH", striped, re.IGNORECASE):
-                return i + 1
+            k_ky = bisect.bisect_right(ky_lines, noi_nhan_line)
+            if k_ky < len(ky_lines):
+                i = ky_lines[k_ky]
+                # Tìm separator "***" sau Ký
+                k_star = bisect.bisect_right(star_lines, i)
+                if k_star < len(star_lines):
+                    j = star_lines[k_star]
+                    # Tìm "## QUY ĐỊNH" sau separator
+                    k_qd = bisect.bisect_right(quy_dinh_lines, j)
+                    if k_qd < len(quy_dinh_lines):
+                        # Điểm xuất phát là sau dòng ## QUY ĐỊNH (có thể là Chương hoặc Điều)
+                        return quy_dinh_lines[k_qd] + 1
+                    return j + 2  # Trả về sau separator
+                return i + 3  # Trả về sau Ký
+        
+        # Bước 4: "NHỮNG QUY ĐỊNH CHUNG"
+        if nhung_quy_dinh_line is not None:
+            return nhung_quy_dinh_line + 1
+        
+        # Bước 5: "## QUY ĐỊNH"
+        if quy_dinh_lines:
+            return quy_dinh_lines[0] + 1
         
         return None
 
-    def _split_by_hierarchy(self, text: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+    def _iter_hierarchy(self, text: str, lines: Optional[List[str]] = None) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
         """
         Split text by Vietnamese legal hierarchy (Điều, Khoản, Chương, etc.)
         Các block Căn cứ và Quyết định đã được xử lý riêng ở split_document()
         
         CHỈ parse các Điều từ điểm xuất phát (sau khi gặp "Nơi nhận", "NHỮNG QUY ĐỊNH CHUNG", "ký", "QUY ĐỊNH")
+        Generator: sinh lần lượt từng section Điều/Khoản ngay khi tách xong,
+        không giữ toàn bộ danh sách sections trong bộ nhớ.
+        lines: text.split('\n') nếu caller đã tách sẵn; được dùng chung cho mọi bước bên dưới.
         """
-        sections: List[Tuple[str, str, Dict[str, Any]]] = []
+        if lines is None:
+            lines = text.split('\n')
+        # Strip mỗi dòng MỘT lần, dùng chung cho mọi bước dò ranh giới; nội dung vẫn lấy từ lines (bản gốc)
+        stripped_lines = [ln.strip() for ln in lines]
 
         # Tìm điểm xuất phát (start point) dựa trên các từ khóa
-        start_point_line = self._find_dieu_start_point(text)
+        start_point_line = self._find_dieu_start_point(text, lines, stripped_lines)
         if start_point_line is None:
             start_point_line = 0
         
@@ -611,127 +781,164 @@ class EnhancedVnLegalSplitter:
         # Tìm vùng Quyết định để khóa parse Điều bên trong
         qd_start_char, qd_end_char, qd_start_line, qd_end_line = find_quyet_dinh_span(text)
 
-        lines = text.split('\n')
-        n = len(lines)
+        # Một lượt quét cho cả văn bản:
+        #   - chỉ mục ranh giới Điều/Chương/Phụ lục/Nơi nhận
+        #   - các dòng mở đầu Điều, vòng lặp chỉ nhảy giữa các dòng này
+        boundary_index, (head_lines, head_matches) = self._index_lines(lines, stripped_lines)
 
-        # Helper: kiểm tra dòng có nằm trong vùng Quyết định
-        def in_qd_region(line_idx: int) -> bool:
-            return (qd_start_line is not None and qd_end_line is not None
-                    and qd_start_line <= line_idx <= qd_end_line)
+        # Gán sẵn các method/attribute dùng trong vòng lặp vào biến local
+        extract_article = self._extract_article_from_position
+        should_split_by_khoan = self._should_split_article_by_khoan
+        split_by_khoan = self._split_article_by_khoan
+        is_free_mode = (qd_start_line is None)  # không có QĐ trong tài liệu
 
-        # Parse các section còn lại (CHƯƠNG, ĐIỀU), bỏ qua vùng Quyết định
-        # Bắt đầu từ điểm xuất phát
-        i = start_point_line
-        
-        while i < n:
-            raw_line = lines[i]
-            line = raw_line.strip()
+        # Parse các section còn lại (ĐIỀU), bỏ qua vùng Quyết định
+        # Bắt đầu từ điểm xuất phát. ĐIỀU chỉ parse nếu:
+        #   - KHÔNG có block Quyết định (free mode) HOẶC
+        #   - Có block Quyết định VÀ đang SAU nó (i > qd_end_line)
+        # (dòng CHƯƠNG, dòng rỗng, dòng trong vùng Quyết định không bao giờ là dòng Điều nên tự động bị bỏ qua)
+        first_line = start_point_line if is_free_mode else max(start_point_line, qd_end_line + 1)
+        k = bisect.bisect_left(head_lines, first_line)
+        n_heads = len(head_lines)
 
-            # Skip rỗng
-            if not line:
-                i += 1
-                continue
+        while k < n_heads:
+            i = head_lines[k]
+            content, end_pos = extract_article(lines, i, text, boundary_index, stripped_lines)
+            if content:
+                article_num, article_title = head_matches[k]
+                article_title = article_title.strip()
 
-            # Nếu dòng này ở trong vùng Quyết định, bỏ qua
-            if in_qd_region(i):
-                i += 1
-                continue
-
-            # 1) CHƯƠNG - bỏ qua, không parse làm section riêng, chỉ dùng để chia văn bản
-            m_chuong = re.search(
-                r'(?im)^\s*\*\*(Chương|Chuong)\s+([IVXLC\d]+)\s*[—\-]?\s*(.*?)\*\*', line
-            )
-            if m_chuong:
-                i += 1
+                # Điều ngắn (< 600 ký tự) luôn giữ nguyên -> xét độ dài trước, khỏi xét tiêu đề / chạy regex khoản
+                if len(content) >= 600 and should_split_by_khoan(article_title):
+                    yield from split_by_khoan(content, article_num, article_title)
+                else:
+                    yield (
+                        'article',
+                        content,
+                        {'article_num': article_num, 'article_title': article_title}
+                    )
+                # Tiếp tục từ dòng Điều đầu tiên sau phần nội dung vừa lấy
+                k = bisect.bisect_left(head_lines, end_pos + 1, k + 1)
                 continue
 
-            # 3) ĐIỀU - Chỉ parse nếu:
-            #   - KHÔNG có block Quyết định (free mode) HOẶC
-            #   - Có block Quyết định VÀ đang SAU nó (i > qd_end_line)
-            is_after_qd = (qd_start_line is not None) and (i > qd_end_line)
-            is_free_mode = (qd_start_line is None)  # không có QĐ trong tài liệu
-            
-            if is_free_mode or is_after_qd:
-                m_article = (
-                    re.search(r'(?im)^\s*\*\*(Điều|Dieu)\s+(\d+)\s*[—\-\.]?\s*(.*?)\*\*', line) or
-                    re.search(r'(?im)^\s*\*\*(Điều|Dieu)\s+(\d+)\s*\.?\s*(.*?)$', line) or
-                    re.search(r'(?im)^\s*(Điều|Dieu)\s+(\d+)\s*\.?\s*(.*?)$', line)
-                )
-                if m_article:
-                    content, end_pos = self._extract_article_from_position(lines, i, text)
-                    if content:
-                        article_num = m_article.group(2)
-                        article_title = (m_article.group(3) or "").strip()
-
-                        if self._should_split_article_by_khoan(article_title):
-                            khoan_sections = self._split_article_by_khoan(content, article_num, article_title)
-                            sections.extend(khoan_sections)
-                        else:
-                            sections.append((
-                                'article',
-                                content,
-                                {'article_num': article_num, 'article_title': article_title}
-                            ))
-                        i = end_pos + 1
-                        continue
-
-            i += 1
-
-        return sections
+            k += 1
     
   
     
-    def _extract_article_from_position(self, lines: List[str], start_pos: int, full_text: str) -> Tuple[str, int]:
-        """Extract article content starting from given position."""
-        article_lines = []
-        i = start_pos
-        
-        # Add the article line itself
-        article_lines.append(lines[start_pos])
-        i += 1
+    def _match_article_head(self, line: str) -> Optional[Tuple[str, str]]:
+        """
+        Nhận diện dòng (đã strip) mở đầu một Điều: **Điều N. Tiêu đề**, **Điều N. Tiêu đề, Điều N. Tiêu đề.
+        Trả về (số Điều, tiêu đề thô) hoặc None. Chỉ một lần match cho mỗi dòng.
+        """
+        m = self._boundary['article_head'].match(line)
+        if m is None:
+            return None
+        if m.group('num_b') is not None:
+            return m.group('num_b'), m.group('title_b')
+        return m.group('num'), m.group('title')
+
+    def _classify_boundary_line(self, line: str) -> Optional[str]:
+        """
+        Phân loại một dòng (đã strip) khi gom nội dung Điều:
+            - 'skip': heading markdown, dòng Chương, đường kẻ -> bỏ qua
+            - 'stop': Điều/Chương/Phụ lục/Nơi nhận tiếp theo -> dừng
+            - None: dòng nội dung bình thường
+        """
+        # Skip Chương lines, markdown headings (#, ##, ###), and separators
+        if (self._skip_match(line) or
+                (line[:1] in _SEP_CHARS and _is_separator(line)) or
+                ('#' in line and self._heading_chuong_search(line))):  # cần '#', tránh quét IGNORECASE cả dòng
+            return 'skip'
         
-        # Look for next legal boundary
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            # Skip Chương lines, markdown headings, and separators
-            if (re.search(r'^#+\s*', line) or  # Skip any markdown heading (#, ##, ###)
-                re.search(r'#+\s*(CHƯƠNG|Chương)', line, re.IGNORECASE) or
-                re.search(r'^\s*\*\*(CHƯƠNG|Chương)\s+', line, re.IGNORECASE) or
-                re.search(r'^\s*(CHƯƠNG|Chương)\s+[IVXLC\d]+', line, re.IGNORECASE) or
-                re.search(r'^_{5,}$|^=+$|^\-+$', line)):
-                i += 1
+        # Stop at next legal boundaries (Điều/Chương/Phụ lục/Nơi nhận) - một regex cho mọi dạng
+        if self._stop_match(line):
+            return 'stop'
+        return None
+
+    def _index_lines(self, lines: List[str], stripped_lines: Optional[List[str]] = None) -> Tuple[Tuple[List[int], Set[int]], Tuple[List[int], List[Tuple[str, str]]]]:
+        """
+        Quét (lex) toàn bộ văn bản MỘT lần, mỗi dòng chỉ strip một lần
+        (stripped_lines: [ln.strip() for ln in lines] nếu caller đã tính sẵn), trả về:
+            - boundary_index = (boundary_lines, skip_lines):
+                boundary_lines: danh sách (đã sắp xếp) chỉ số dòng là ranh giới dừng
+                skip_lines: tập chỉ số dòng cần bỏ qua khi gom nội dung
+              Dùng cho _extract_article_from_position để tìm ranh giới kế tiếp bằng bisect
+              thay vì quét lại từng dòng cho mỗi Điều.
+            - article_heads = (head_lines, head_matches):
+                chỉ số dòng mở đầu Điều (đã sắp xếp) và (số Điều, tiêu đề thô) tương ứng
+        """
+        boundary_lines: List[int] = []
+        skip_lines: Set[int] = set()
+        head_lines: List[int] = []
+        head_matches: List[Tuple[str, str]] = []
+        classify = self._classify_boundary_line
+        match_head = self._match_article_head
+        boundary_append = boundary_lines.append
+        skip_add = skip_lines.add
+        lead_chars = _BOUNDARY_LEAD_CHARS
+        if stripped_lines is None:
+            stripped_lines = [ln.strip() for ln in lines]
+        for idx, line in enumerate(stripped_lines):
+            # Dòng trống / dòng nội dung thường: không pattern nào khớp được -> bỏ qua, không chạy regex
+            if not line or (line[0] not in lead_chars and '#' not in line):
                 continue
-            
-            # Stop at next legal boundaries - support multiple patterns
-            if (re.search(r'^\s*\*\*Điều\s+\d+', line, re.IGNORECASE) or
-                re.search(r'^\s*Điều\s+\d+', line, re.IGNORECASE) or
-                re.search(r'^\s*\*\*Chương\s+[IVXLC\d]+', line, re.IGNORECASE) or
-                re.search(r'^\s*Chương\s+[IVXLC\d]+', line, re.IGNORECASE) or
-                re.search(r'^\s*\*\*Phụ\s+lục\s+\d+', line, re.IGNORECASE) or
-                re.search(r'^\s*Phụ\s+lục\s+\d+', line, re.IGNORECASE) or
-                re.search(r'^\s*Nơi\s+nhận', line, re.IGNORECASE)):
-                break
-            
-            article_lines.append(lines[i])
-            i += 1
-        
-        content = '\n'.join(article_lines) if article_lines else ""
+            kind = classify(line)
+            if kind == 'stop':
+                boundary_append(idx)
+            elif kind == 'skip':
+                skip_add(idx)
+            m = match_head(line)
+            if m:
+                head_lines.append(idx)
+                head_matches.append(m)
+        return (boundary_lines, skip_lines), (head_lines, head_matches)
+
+    def _extract_article_from_position(self, lines: List[str], start_pos: int, full_text: str,
+                                       boundary_index: Optional[Tuple[List[int], Set[int]]] = None,
+                                       stripped_lines: Optional[List[str]] = None) -> Tuple[str, int]:
+        """
+        Extract article content starting from given position.
+        boundary_index: phần tử đầu trong kết quả của _index_lines(lines) nếu đã tính sẵn cho cả văn bản.
+        stripped_lines: [ln.strip() for ln in lines] nếu đã tính sẵn; dò ranh giới trên bản đã strip,
+        nội dung vẫn lấy từ lines.
+        """
+        b = self._boundary
+        # Không có sẵn bản strip: chỉ strip các dòng thực sự được xét
+        stripped_at = (stripped_lines.__getitem__ if stripped_lines is not None
+                       else lambda j: lines[j].strip())
+        if boundary_index is not None:
+            # Ranh giới kế tiếp: dòng 'stop' đầu tiên sau start_pos
+            boundary_lines, skip_lines = boundary_index
+            k = bisect.bisect_right(boundary_lines, start_pos)
+            i = boundary_lines[k] if k < len(boundary_lines) else len(lines)
+            body = (j for j in range(start_pos + 1, i) if j not in skip_lines)
+        else:
+            # Look for next legal boundary
+            body = []
+            i = start_pos + 1
+            while i < len(lines):
+                kind = self._classify_boundary_line(stripped_at(i))
+                if kind == 'stop':
+                    break
+                if kind is None:
+                    body.append(i)
+                i += 1
         
         # Clean content: remove any Chương-related lines
+        # (lọc ngay khi duyệt dòng nguồn, không dựng list article_lines trung gian)
         clean_lines = []
-        for line in content.split('\n'):
-            stripped = line.strip()
-            # Skip if contains Chương patterns, separators, or markdown headings
-            if (re.search(r'^#+\s*', stripped) or  # Skip any markdown heading
-               re.search(r'^\s*\*\*(CHƯƠNG|Chương)', stripped, re.IGNORECASE) or
-               re.search(r'^\s*(CHƯƠNG|Chương)\s+[IVXLC\d]+', stripped, re.IGNORECASE) or
-               re.search(r'^_{5,}$|^=+$|^\-+$', stripped) or
-               # Skip chapter titles (all caps lines >= 20 chars, likely Vietnamese chapter titles)
-               # Allow punctuation and Vietnamese accents
-               (re.match(r'^[A-ZÀÁẢÃẠÂẦẤẨẪẬĂẰẮẲẴẶÈÉẺẼẸÊỀẾỂỄỆÌÍỈĨỊÒÓỎÕỌÔỒỐỔỖỘƠỜỚỞỠỢÙÚỦŨỤƯỪỨỬỮỰỲÝỶỸỴĐ\s,.;:!\?]+$', stripped) and len(stripped) > 20)):
-                continue
-            clean_lines.append(line)
+        
+        # Dòng mở đầu: xét đủ heading / Chương / đường kẻ
+        stripped = stripped_at(start_pos)
+        if not (stripped.startswith('#') or  # Skip any markdown heading
+                b['chuong_title'].search(stripped) or
+                _is_separator(stripped) or
+                _should_skip_clean_line(stripped)):
+            clean_lines.append(lines[start_pos])
+        
+        # Các dòng sau đều đã qua lọc 'skip' (_classify_boundary_line / chỉ mục) nên chắc chắn
+        # không khớp heading / Chương / đường kẻ -> chỉ cần _should_skip_clean_line.
+        clean_lines.extend(lines[j] for j in body if not _should_skip_clean_line(stripped_at(j)))
         
         content = '\n'.join(clean_lines) if clean_lines else ""
         return content, i - 1  # Return the last processed position
@@ -791,12 +998,13 @@ class EnhancedVnLegalSplitter:
 
     def _should_split_article_by_khoan(self, article_title: str) -> bool:
         """Check if article should be split by khoan based on title."""
-        # Special cases for Điều 1
-        if self._is_d1_scope_and_subject(article_title) or self._is_scope_only(article_title):
+        # Check if title contains "và" - this is the key rule
+        # (xét trước: phép so chuỗi rẻ, loại ngay phần lớn tiêu đề mà không cần lower())
+        if "và" not in article_title:
             return False
         
-        # Check if title contains "và" - this is the key rule
-        return "và" in article_title
+        # Special cases for Điều 1
+        return not (self._is_d1_scope_and_subject(article_title) or self._is_scope_only(article_title))
     
     def _split_article_by_khoan(self, article_content: str, article_num: str, article_title: str) -> List[Tuple[str, str, Dict[str, Any]]]:
         """Split article by khoan following exact rule."""
@@ -811,19 +1019,14 @@ class EnhancedVnLegalSplitter:
             return sections
         
         # Split by numbered clauses (1., 2., 3., etc.)
-        khoan_matches = list(re.finditer(r'(?m)^\s*([0-9]+)\.\s+(.*)$', article_content))
+        # Chỉ giữ (số khoản, vị trí bắt đầu), không giữ match object
+        offsets = [(m.group(1), m.start()) for m in _RE_KHOAN.finditer(article_content)]
         
-        if khoan_matches:
-            for i, match in enumerate(khoan_matches):
-                khoan_num = match.group(1)
-                
-                # Determine clause boundaries
-                start_pos = match.start()
-                if i + 1 < len(khoan_matches):
-                    end_pos = khoan_matches[i + 1].start()
-                else:
-                    end_pos = len(article_content)
-                
+        if offsets:
+            # Determine clause boundaries: mỗi khoản kéo dài tới đầu khoản kế tiếp, khoản cuối tới hết Điều
+            offsets.append((None, len(article_content)))
+            
+            for (khoan_num, start_pos), (_, end_pos) in pairwise(offsets):
                 khoan_text = article_content[start_pos:end_pos].strip()
                 
                 if khoan_text:
@@ -848,58 +1051,20 @@ class EnhancedVnLegalSplitter:
         # Determine source based on section_type first (priority)
         source = ""
 
-        if section_type == 'legal_basis':
-            source = "Căn cứ"
-        elif section_type == 'quyet_dinh':
-            source = "Quyết định"
-        elif section_type == 'article':
-            article_num = section_info.get('article_num', '')
-            source = f"Điều {article_num}"
-        elif section_type == 'khoan':
-            # Format: Điều X, Khoản Y (theo test.md)
-            article_num = section_info.get('article_num', '')
-            khoan_num = section_info.get('khoan_num', '')
-            source = f"Điều {article_num}, Khoản {khoan_num}"
-        elif section_type == 'subsection':
-            # subsection = numbered 1., 2., ... nhưng khác nhánh 'khoan'
-            article_num = section_info.get('article_num', '')
-            num = section_info.get('subsection_num', '')
-            source = f"Điều {article_num}, Khoản {num}"
+        builder = _SOURCE_BUILDERS.get(section_type)
+        if builder is not None:
+            source = builder(section_info)
         elif section_type == 'khoan_number_clause':
             # chuyển "Khoản n của Điều X" sang format thống nhất
             src = section_info.get('khoan_number_source', '')  # e.g., "Khoản 3 của Điều 8"
-            m = re.search(r'Khoản\s+(\d+).*?Điều\s+(\d+)', src)
+            # (pattern cần cả "Khoản" lẫn "Điều" nguyên văn -> so chuỗi trước khi chạy regex)
+            m = _RE_KHOAN_OF_DIEU.search(src) if ('Khoản' in src and 'Điều' in src) else None
             if m:
                 khoan_num, article_num = m.group(1), m.group(2)
                 source = f"Điều {article_num}, Khoản {khoan_num}"
             else:
                 # fallback
-                article_num = section_info.get('article_num', '')
-                khoan_num = section_info.get('khoan_num', '')
-                source = f"Điều {article_num}, Khoản {khoan_num}"
-        elif section_type == 'point':
-            article_num = section_info.get('article_num', '')
-            clause_num = section_info.get('clause_num', '') or section_info.get('khoan_num', '')
-            point_letter = section_info.get('point_letter', '')
-            # Format: Điều X, Khoản Y, Điểm Z (theo test.md)
-            source = f"Điều {article_num}, Khoản {clause_num}, Điểm {point_letter}"
-        elif section_type in ('nhu_sau_clause', 'nhu_sau_article'):
-            # giữ Điều/Khoản nếu có, còn lại fallback Điều X
-            article_num = section_info.get('article_num', '')
-            clause_num = section_info.get('clause_num', '')
-            source = f"Điều {article_num}" + (f", Khoản {clause_num}" if clause_num else "")
-        elif section_type in ('quy_trinh_clause', 'quy_trinh_article'):
-            article_num = section_info.get('article_num', '')
-            clause_num = section_info.get('clause_num', '')
-            source = f"Điều {article_num}" + (f", Khoản {clause_num}" if clause_num else "")
-        elif section_type == 'chuong':
-            # Format: Chương X — tiêu đề
-            chuong_source = section_info.get('source', '')
-            source = chuong_source
-        elif section_type == 'phu_luc':
-            # Format: Phụ lục X
-            phu_luc_num = section_info.get('phu_luc_num', '')
-            source = f"Phụ lục {phu_luc_num}"
+                source = _source_khoan(section_info)
         
         # If section_type logic failed, fallback to content analysis
         if not source:
@@ -925,8 +1090,25 @@ class EnhancedVnLegalSplitter:
         Returns:
             Markdown string with blocks separated by ---
         """
+        return '\n'.join(self.iter_markdown(blocks))
+    
+    def write_markdown(self, blocks: List[LegalBlock], fp) -> None:
+        """
+        Ghi kết quả to_markdown(blocks) thẳng vào file object fp (mở ở text mode),
+        từng đoạn một, không dựng chuỗi markdown đầy đủ trong bộ nhớ.
+        """
+        sep = ''
+        for chunk in self.iter_markdown(blocks):
+            fp.write(sep)
+            fp.write(chunk)
+            sep = '\n'
+    
+    def iter_markdown(self, blocks: List[LegalBlock]) -> Iterator[str]:
+        """
+        Sinh lần lượt các dòng / đoạn markdown của to_markdown (nối bằng '\\n' là ra kết quả đầy đủ).
+        """
         if not blocks:
-            return ""
+            return
         
         # Extract document title từ blocks để generate keyword
         # Sử dụng helper method để tái sử dụng code
@@ -941,8 +1123,6 @@ class EnhancedVnLegalSplitter:
                 keyword = self.keyword_generator.generate_keyword(document_title)
                 logger.info(f"Generated keyword '{keyword}' from document title: {document_title}")
         
-        markdown_lines = []
-        
         for i, block in enumerate(blocks):
             # Thêm separator trước mỗi block (trừ block đầu tiên)
             # Đặc biệt: thêm nhiều line breaks trước các Điều mới (xuất phát trang mới)
@@ -950,15 +1130,10 @@ class EnhancedVnLegalSplitter:
                 # Kiểm tra nếu là block "Điều" (bắt đầu một điều mới)
                 if block.source.startswith("Điều"):
                     # Xuất phát trang mới - thêm 2 dòng trống trước separator
-                    markdown_lines.append("")
-                    markdown_lines.append("")
-                    markdown_lines.append("---")
-                    markdown_lines.append("")
+                    yield from _DIEU_SEP
                 else:
                     # Các block khác - chỉ 1 dòng trống
-                    markdown_lines.append("")
-                    markdown_lines.append("---")
-                    markdown_lines.append("")
+                    yield from _OTHER_SEP
             
             # Xử lý đặc biệt cho block "Căn cứ" và "Quyết định"
             if block.source == "Căn cứ":
@@ -971,7 +1146,7 @@ class EnhancedVnLegalSplitter:
                 }
                 # Sử dụng build_can_cu_markdown với keyword và content
                 block_markdown = build_can_cu_markdown(metadata_dict, keyword, block.content)
-                markdown_lines.append(block_markdown)
+                yield block_markdown
             elif block.source == "Quyết định":
                 metadata_dict = {
                     'doc_id': block.doc_id,
@@ -982,22 +1157,18 @@ class EnhancedVnLegalSplitter:
                 }
                 # Sử dụng build_quyet_dinh_markdown_with_content với keyword và content
                 block_markdown = build_quyet_dinh_markdown_with_content(metadata_dict, keyword, block.content)
-                markdown_lines.append(block_markdown)
+                yield block_markdown
             else:
-                # Các block khác: giữ nguyên format cũ
-                markdown_lines.append("## Metadata")
-                markdown_lines.append(f"- **doc_id:** {block.doc_id}")
-                markdown_lines.append(f"- **department:** {block.department}")
-                markdown_lines.append(f"- **type_data:** {block.type_data}")
-                markdown_lines.append(f"- **category:** {block.category}")
-                markdown_lines.append(f"- **date:** {block.date}")
-                markdown_lines.append(f"- **source:** {block.source}")
-                markdown_lines.append("")
-                markdown_lines.append("## Nội dung")
-                markdown_lines.append("")
-                markdown_lines.append(block.content)
-        
-        return '\n'.join(markdown_lines)
+                # Các block khác: giữ nguyên format cũ (cả khối dựng bằng một lần format)
+                yield _BLOCK_TEMPLATE.format(
+                    doc_id=block.doc_id,
+                    department=block.department,
+                    type_data=block.type_data,
+                    category=block.category,
+                    date=block.date,
+                    source=block.source,
+                    content=block.content,
+                )
 
 
 def split_vietnamese_legal_document(text: str, api_key: Optional[str] = None, filename: str = "", use_llm: bool = True) -> str:
@@ -82,7 +82,8 @@ class KeywordGenerator:
         Returns:
             Keyword string (first 5 words)
         """
-        words = document_title.split()
+        # maxsplit: chỉ tách tới từ thứ 5, không dựng list mọi từ của title dài
+        words = document_title.split(maxsplit=5)
         return ' '.join(words[:5])
     
     def reset_cache(self):
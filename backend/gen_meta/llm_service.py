@@ -6,22 +6,63 @@ Chức năng chính: Tạo từ khóa chính từ title tài liệu
 
 import os
 import logging
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
 from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
+# Số title tối đa giữ trong cache keyword của OpenAIService (LRU, dùng chung qua singleton)
+TITLE_CACHE_SIZE = 2048
+
+# Circuit breaker cho call_openai: BREAKER_FAIL_MAX lần gọi API lỗi tạm thời (timeout, mất kết nối, 429, 5xx)
+# liên tiếp -> ngắt BREAKER_RESET_TIMEOUT giây, trong thời gian đó call_openai raise ngay để caller fallback.
+# Đếm liên tiếp, không theo cửa sổ thời gian: một lần gọi timeout (kể cả SDK retry) đã mất cỡ
+# (max_retries + 1) * request_timeout giây, cửa sổ ngắn hơn thế sẽ không bao giờ đếm đủ khi request đến tuần tự. Hết thời gian ngắt chỉ cho MỘT lần gọi thử (half-open): lỗi -> ngắt lại ngay, thành công -> đóng mạch.
+BREAKER_FAIL_MAX = 5
+BREAKER_RESET_TIMEOUT = 60.0
+
+# Phần tĩnh của prompt, dựng sẵn một lần thay vì mỗi lần gọi
+_KEYWORD_PROMPT_PREFIX = 'Từ tiêu đề: "'
+_KEYWORD_PROMPT_SUFFIX = '"\n\nRút gọn thành 3-5 từ khóa tiếng Việt. Chỉ trả về từ khóa, không giải thích.'
+_KEYWORD_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "Bạn là trợ lý trích xuất từ khóa tiếng Việt từ tiêu đề tài liệu. Chỉ trả về từ khóa, không giải thích.",
+}
+
+def _first_words(title: str, n: int = 5) -> str:
+    """
+    n từ đầu tiên của title (fallback khi không dùng được LLM).
+    split(maxsplit=n) chỉ tách tới từ thứ n, phần còn lại giữ nguyên một chuỗi -> không dựng list
+    toàn bộ các từ với title rất dài (vd. cả mục lục bị OCR thành title).
+    """
+    return ' '.join(title.split(maxsplit=n)[:n])
+
 # Import OpenAI dynamically
 openai_client = None
 OPENAI_AVAILABLE = False
+# Lỗi kết nối / timeout của SDK (APITimeoutError là lớp con của APIConnectionError)
+_CONNECTION_ERRORS: tuple = (TimeoutError, ConnectionError)
 try:
-    import openai  # type: ignore
-    from openai import OpenAI  # type: ignore
+    from openai import OpenAI, APIConnectionError  # type: ignore
+    _CONNECTION_ERRORS += (APIConnectionError,)
     OPENAI_AVAILABLE = True
 except Exception as e:
     OPENAI_AVAILABLE = False
     logger.warning(f"openai SDK không có sẵn: {e}")
 
+def _is_transient_error(e: Exception) -> bool:
+    """
+    Lỗi tạm thời, đáng tính vào circuit breaker: timeout, mất kết nối, 429 (rate limit) hoặc 5xx.
+    Lỗi 4xx khác (request sai, key không hợp lệ...) không tự hết khi chờ nên không tính.
+    """
+    if isinstance(e, _CONNECTION_ERRORS):
+        return True
+    status = getattr(e, 'status_code', None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
 @dataclass
 class LLMConfig:
     """Cấu hình cho LLM calls"""
@@ -29,6 +70,10 @@ class LLMConfig:
     top_p: float = 1.0
     max_tokens: int = 50  # Giảm xuống vì chỉ cần 3-5 từ
     model_name: str = "gpt-4o-mini"  # GPT-4o mini
+    # Giới hạn thời gian chờ mỗi lần gọi (giây) và số lần SDK tự retry (backoff có jitter khi 429/5xx).
+    # Mặc định của SDK là 600s -> một request treo giữ worker Flask tới 10 phút thay vì fallback ngay.
+    request_timeout: float = 20.0
+    max_retries: int = 2
 
 class OpenAIService:
     """
@@ -51,11 +96,25 @@ class OpenAIService:
         self.enabled = bool(self.api_key) and OPENAI_AVAILABLE
         
         self._oa_client = None
+        # title (đã chuẩn hóa khoảng trắng) -> keyword LLM đã sinh; service là singleton nên
+        # cache sống qua nhiều document / request, title lặp lại không cần gọi API lần nữa
+        self._title_cache: "OrderedDict[str, str]" = OrderedDict()
+        # get + move_to_end / thêm + popitem trên OrderedDict không nguyên tử -> khóa khi nhiều request thread dùng chung
+        self._title_cache_lock = threading.Lock()
+        # Trạng thái circuit breaker (xem BREAKER_*), dùng chung giữa các request thread
+        self._breaker_lock = threading.Lock()
+        self._breaker_fails = 0
+        self._breaker_open_until = 0.0  # 0 = mạch đóng
+        self._breaker_probing = False   # đang có lần gọi thử (half-open)
 
         if self.enabled:
             try:
                 # Khởi tạo OpenAI client
-                self._oa_client = OpenAI(api_key=self.api_key)
+                self._oa_client = OpenAI(
+                    api_key=self.api_key,
+                    timeout=self.config.request_timeout,
+                    max_retries=self.config.max_retries,
+                )
                 logger.info(f"OpenAI LLM ({self.config.model_name}) đã khởi tạo thành công")
             except Exception as e:
                 logger.error(f"Không thể khởi tạo OpenAI client: {e}")
@@ -84,29 +143,42 @@ class OpenAIService:
         """
         if not self.enabled or not title:
             # Fallback: lấy 5 từ đầu tiên từ title
-            words = title.split()[:5]
-            return ' '.join(words)
+            return _first_words(title)
+        
+        # Title chỉ khác nhau ở khoảng trắng / xuống dòng (OCR) dùng chung một keyword
+        cache_key = ' '.join(title.split())
+        with self._title_cache_lock:
+            keyword = self._title_cache.get(cache_key)
+            if keyword is not None:
+                self._title_cache.move_to_end(cache_key)
+        if keyword is not None:
+            logger.debug(f"Keyword cache hit for title '{title}': '{keyword}'")
+            return keyword
         
         try:
             # Prompt ngắn gọn
-            prompt = f'Từ tiêu đề: "{title}"\n\nRút gọn thành 3-5 từ khóa tiếng Việt. Chỉ trả về từ khóa, không giải thích.'
+            prompt = _KEYWORD_PROMPT_PREFIX + title + _KEYWORD_PROMPT_SUFFIX
 
             response = self.call_openai(prompt)
             
             if response and len(response.strip()) > 0:
                 keyword = response.strip()
                 logger.debug(f"Generated keyword from title '{title}': '{keyword}'")
+                # Chỉ cache keyword từ LLM, không cache fallback (lần sau vẫn thử lại LLM)
+                with self._title_cache_lock:
+                    self._title_cache[cache_key] = keyword
+                    self._title_cache.move_to_end(cache_key)
+                    if len(self._title_cache) > TITLE_CACHE_SIZE:
+                        self._title_cache.popitem(last=False)
                 return keyword
             else:
                 # Fallback nếu response rỗng
-                words = title.split()[:5]
-                return ' '.join(words)
+                return _first_words(title)
                 
         except Exception as e:
             logger.warning(f"Lỗi khi tạo keyword từ LLM: {e}")
             # Fallback
-            words = title.split()[:5]
-            return ' '.join(words)
+            return _first_words(title)
     
     def call_openai(self, prompt: str) -> str:
         """Gọi OpenAI (gpt-4o-mini) để sinh keyword."""
@@ -117,19 +189,32 @@ class OpenAIService:
             logger.error("OpenAI client chưa được khởi tạo!")
             raise Exception("OpenAI client chưa được khởi tạo. Kiểm tra lại API key và SDK.")
 
+        model_name = self.config.model_name or 'gpt-4o-mini'
+
+        # API đang lỗi liên tục (outage / 429 kéo dài): không chờ timeout nữa, để caller fallback ngay
+        if not self._breaker_allow_call():
+            raise Exception("OpenAI tạm ngắt (circuit breaker) do lỗi liên tiếp")
+
         try:
-            model_name = self.config.model_name or 'gpt-4o-mini'
-            
             # Sử dụng Chat Completions API
-            completion = self._oa_client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": "Bạn là trợ lý trích xuất từ khóa tiếng Việt từ tiêu đề tài liệu. Chỉ trả về từ khóa, không giải thích."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=self.config.temperature,
-                max_tokens=self.config.max_tokens,
-            )
+            try:
+                completion = self._oa_client.chat.completions.create(
+                    model=model_name,
+                    messages=[
+                        _KEYWORD_SYSTEM_MESSAGE,
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=self.config.temperature,
+                    max_tokens=self.config.max_tokens,
+                )
+            except Exception as e:
+                if _is_transient_error(e):
+                    self._record_api_failure()
+                else:
+                    # API vẫn phản hồi (lỗi do request) -> không phải sự cố của dịch vụ
+                    self._record_api_success()
+                raise
+            self._record_api_success()
             
             # Trích xuất text từ response
             if completion.choices and len(completion.choices) > 0:
@@ -146,24 +231,73 @@ class OpenAIService:
             logger.error(f"Lỗi khi gọi OpenAI: {e}")
             raise
 
+    def _breaker_allow_call(self) -> bool:
+        """
+        Mạch đóng: cho gọi. Mạch ngắt: chặn cho tới hết BREAKER_RESET_TIMEOUT, sau đó chỉ cho đúng
+        MỘT request thử (half-open); các request khác vẫn bị chặn cho tới khi lần thử có kết quả.
+        """
+        if not self._breaker_open_until:
+            return True
+        with self._breaker_lock:
+            if not self._breaker_open_until:
+                return True
+            if self._breaker_probing or time.monotonic() < self._breaker_open_until:
+                return False
+            self._breaker_probing = True
+            return True
+
+    def _record_api_failure(self) -> None:
+        """
+        Ghi nhận một lần gọi API lỗi tạm thời; đủ BREAKER_FAIL_MAX lần liên tiếp thì ngắt mạch.
+        Lần gọi thử (half-open) lỗi -> ngắt lại ngay.
+        """
+        now = time.monotonic()
+        with self._breaker_lock:
+            if self._breaker_probing:
+                self._breaker_probing = False
+                self._breaker_open_until = now + BREAKER_RESET_TIMEOUT
+                logger.warning(f"OpenAI vẫn lỗi sau thời gian ngắt, tạm ngắt thêm {BREAKER_RESET_TIMEOUT:.0f}s")
+                return
+            self._breaker_fails += 1
+            if self._breaker_fails >= BREAKER_FAIL_MAX:
+                self._breaker_open_until = now + BREAKER_RESET_TIMEOUT
+                self._breaker_fails = 0
+                logger.warning(f"OpenAI lỗi {BREAKER_FAIL_MAX} lần liên tiếp, tạm ngắt {BREAKER_RESET_TIMEOUT:.0f}s")
+
+    def _record_api_success(self) -> None:
+        """Gọi API thành công (hoặc API có phản hồi): xóa đếm lỗi, đóng mạch."""
+        if self._breaker_fails or self._breaker_open_until:
+            with self._breaker_lock:
+                self._breaker_fails = 0
+                self._breaker_open_until = 0.0
+                self._breaker_probing = False
+
 
-# Singleton instance
-_llm_service_instance = None
+# Một instance cho mỗi API key (key truyền vào hoặc OPENAI_API_KEY); cùng key dùng chung client,
+# cache và circuit breaker, key khác (tenant khác) có service riêng
+_llm_services: Dict[str, OpenAIService] = {}
+# Khóa khởi tạo: nhiều request thread Flask gọi đồng thời lần đầu chỉ tạo MỘT OpenAI client cho mỗi key
+_llm_service_lock = threading.Lock()
 
 def get_llm_service(api_key: Optional[str] = None, config: Optional[LLMConfig] = None) -> OpenAIService:
     """
-    Lấy singleton instance của LLM service
+    Lấy instance LLM service dùng chung cho API key tương ứng
     
     Args:
-        api_key: OpenAI API key
-        config: Cấu hình LLM
+        api_key: OpenAI API key (mặc định: OPENAI_API_KEY)
+        config: Cấu hình LLM (chỉ dùng khi tạo instance lần đầu cho key đó)
         
     Returns:
         OpenAIService instance
     """
-    global _llm_service_instance
+    key = api_key or os.getenv('OPENAI_API_KEY') or ''
     
-    if _llm_service_instance is None:
-        _llm_service_instance = OpenAIService(api_key, config)
+    # Đường nhanh không cần khóa khi đã khởi tạo; kiểm tra lại bên trong khóa (double-checked locking)
+    service = _llm_services.get(key)
+    if service is None:
+        with _llm_service_lock:
+            service = _llm_services.get(key)
+            if service is None:
+                service = _llm_services[key] = OpenAIService(key or None, config)
     
-    return _llm_service_instance
+    return service
@@ -12,6 +12,28 @@ import unicodedata
 
 logger = logging.getLogger(__name__)
 
+# Các pattern dùng trong module, biên dịch một lần khi import thay vì mỗi lần gọi hàm
+_WS_RUN_PAT = re.compile(r"\s+")
+
+# "QUYẾT ĐỊNH:" dạng **bold** / dạng thường (bỏ qua heading markdown) và "Nơi nhận:" (extract_quyet_dinh_block)
+_QD_BOLD_START_PAT = re.compile(r"\*\*QUYẾT\s*ĐỊNH\s*:", re.IGNORECASE)
+_QD_PLAIN_START_PAT = re.compile(r"(?<!##\s)(?<!\*\*)QUYẾT\s*ĐỊNH\s*:", re.IGNORECASE)
+_NOI_NHAN_COLON_PAT = re.compile(r"Nơi\s+nhận\s*:", re.IGNORECASE)
+_MD_HEADING_PAT = re.compile(r'^#+\s*', re.MULTILINE)
+
+# Dòng QĐ và "Nơi nhận" (find_quyet_dinh_span): cho phép #, **, có/không dấu : và có text cùng dòng
+_QD_LINE_PAT = re.compile(
+    r'(?im)^[ \t]*#*\s*\*{0,2}\s*(QUYẾT\s*ĐỊNH)\*{0,2}\s*:?[^\n]*$'
+)
+_NOI_NHAN_SPAN_PAT = re.compile(r'(?im)^[ \t]*[\*\-\u2022]?\s*N[ơo]i\s+nh[aă]n\s*:?')
+
+# Dòng 'Nơi nhận' (extract_quyet_dinh_to_noi_nhan): chịu *, -, bullet •, có/không dấu, cho phép nội dung sau :
+_NOI_NHAN_LINE_PAT = re.compile(r'(?mi)^\s*[\*\-\u2022]?\s*N[ơo]i\s+nh[aă]n\s*:[^\n]*$')
+
+# Dòng mở đầu QĐ / Điều (extract_quyet_dinh_section)
+_QD_HEAD_PAT = re.compile(r'^\s*QUYẾT\s*ĐỊNH', re.IGNORECASE)
+_DIEU_HEAD_PAT = re.compile(r'^\s*Điều\s+\d+', re.IGNORECASE)
+
 
 def _fold_text(s: str) -> str:
     """
@@ -22,7 +44,7 @@ def _fold_text(s: str) -> str:
     s_no_accent = "".join(ch for ch in s_nfkd if not unicodedata.combining(ch))
     s_low = s_no_accent.lower()
     # nén khoảng trắng cho regex chấm câu lởm khởm
-    s_low = re.sub(r"\s+", " ", s_low)
+    s_low = _WS_RUN_PAT.sub(" ", s_low)
     return s_low
 
 
@@ -46,6 +68,17 @@ def _original_index_from_folded(original: str, folded: str, idx_in_folded: int)
     return o
 
 
+# Mốc kết thúc dự phòng của block Quyết định khi không có "Nơi nhận":
+#   - Chữ ký, đóng dấu phổ biến
+#   - Ranh giới pháp lý: Điều/Chương/Phụ lục đầu tiên SAU dòng QĐ
+_QD_FALLBACK_END_PAT = re.compile(
+    r'(?im)(?P<signature>^(KT\.\s*HIỆU TRƯỞNG|HIỆU TRƯỞNG|TM\.\s*|GIÁM ĐỐC|CHỦ TỊCH)\b)'
+    r'|(?P<article>^[ \t]*\*{0,2}\s*Điều\s+\d+)'
+    r'|(?P<chuong>^[ \t]*\*{0,2}\s*Chương\s+[IVXLC\d]+)'
+    r'|(?P<phuluc>^[ \t]*\*{0,2}\s*Phụ\s*lục\s+\d+)'
+)
+
+
 def extract_quyet_dinh_block(text: str) -> str:
     """
     Lấy block Quyết định (tổng quát):
@@ -54,14 +87,12 @@ def extract_quyet_dinh_block(text: str) -> str:
     """
     # Tìm "QUYẾT ĐỊNH:" trong text - BỎ QUA heading markdown "## QUYẾT ĐỊNH"
     # Chỉ lấy phần "**QUYẾT ĐỊNH:**" hoặc "QUYẾT ĐỊNH:"
-    p_noi_nhan = re.compile(r"Nơi\s+nhận\s*:", re.IGNORECASE)
-    
     # Try pattern 1: "**QUYẾT ĐỊNH:**" (bold với **)
-    m_start = re.search(r"\*\*QUYẾT\s*ĐỊNH\s*:", text, re.IGNORECASE)
+    m_start = _QD_BOLD_START_PAT.search(text)
     
     # Try pattern 2: "QUYẾT ĐỊNH:" (plain text, không có markdown)
     if not m_start:
-        m_start = re.search(r"(?<!##\s)(?<!\*\*)QUYẾT\s*ĐỊNH\s*:", text, re.IGNORECASE)
+        m_start = _QD_PLAIN_START_PAT.search(text)
     
     if not m_start:
         return ""
@@ -69,7 +100,7 @@ def extract_quyet_dinh_block(text: str) -> str:
     start_idx = m_start.start()
     
     # Tìm "Nơi nhận:" sau "QUYẾT ĐỊNH"
-    m_noi = p_noi_nhan.search(text, pos=start_idx)
+    m_noi = _NOI_NHAN_COLON_PAT.search(text, pos=start_idx)
     if m_noi:
         end_idx = m_noi.start()
     else:
@@ -78,9 +109,10 @@ def extract_quyet_dinh_block(text: str) -> str:
     block = text[start_idx:end_idx]
     
     # Xóa tất cả ký tự markdown (*, **, #) trong toàn bộ block
-    block = block.replace('**', '').replace('*', '')
+    # (xóa mọi '*' đã bao gồm cả '**', không cần thêm một bản sao trung gian)
+    block = block.replace('*', '')
     # Xóa # từ đầu các dòng
-    block = re.sub(r'^#+\s*', '', block, flags=re.MULTILINE)
+    block = _MD_HEADING_PAT.sub('', block)
     
     return block.strip()
 
@@ -91,51 +123,30 @@ def find_quyet_dinh_span(text: str) -> Tuple[Optional[int], Optional[int], Optio
     - qd_end_line là dòng TRƯỚC 'Nơi nhận' (nếu có), còn nếu không có thì tới hết văn bản.
     """
     # Cho phép #, **, có/không dấu : và có text cùng dòng
-    qd_pat = re.compile(
-        r'(?im)^[ \t]*#*\s*\*{0,2}\s*(QUYẾT\s*ĐỊNH|Quyết\s*định)\*{0,2}\s*:?[^\n]*$'
-    )
-    # "Nơi nhận": linh hoạt, có/không dấu :
-    noi_nhan_pat = re.compile(r'(?im)^[ \t]*[\*\-\u2022]?\s*N[ơo]i\s+nh[aă]n\s*:?')
-
-    m_qd = qd_pat.search(text)
+    m_qd = _QD_LINE_PAT.search(text)
     if not m_qd:
         return None, None, None, None
 
     qd_start_char = m_qd.start()
 
     # 1) Ưu tiên tìm "Nơi nhận"
-    m_noi_nhan = noi_nhan_pat.search(text, m_qd.end())
+    # "Nơi nhận": linh hoạt, có/không dấu :
+    m_noi_nhan = _NOI_NHAN_SPAN_PAT.search(text, m_qd.end())
     if m_noi_nhan:
         qd_end_char = m_noi_nhan.start()
     else:
         # 2) Fallback: tìm chữ ký hoặc ranh giới pháp lý đầu tiên sau QĐ
-        end_candidates = []
-
-        # Chữ ký, đóng dấu phổ biến
-        signature_pat = re.compile(r'(?im)^(KT\.\s*HIỆU TRƯỞNG|HIỆU TRƯỞNG|TM\.\s*|GIÁM ĐỐC|CHỦ TỊCH)\b')
-        m_sig = signature_pat.search(text, m_qd.end())
-        if m_sig:
-            end_candidates.append(m_sig.start())
-
-        # Ranh giới pháp lý: Điều/Chương/Phụ lục đầu tiên SAU dòng QĐ
-        article_pat = re.compile(r'(?im)^[ \t]*\*{0,2}\s*Điều\s+\d+')
-        chuong_pat  = re.compile(r'(?im)^[ \t]*\*{0,2}\s*Chương\s+[IVXLC\d]+')
-        phuluc_pat  = re.compile(r'(?im)^[ \t]*\*{0,2}\s*Phụ\s*lục\s+\d+')
-
-        for p in (article_pat, chuong_pat, phuluc_pat):
-            m = p.search(text, m_qd.end())
-            if m:
-                end_candidates.append(m.start())
+        #    (một regex gộp: match đầu tiên chính là mốc nhỏ nhất trong các ứng viên)
+        m_end = _QD_FALLBACK_END_PAT.search(text, m_qd.end())
 
         # Nếu có ứng viên thì chốt trước mốc nhỏ nhất, nếu không thì hết file
-        qd_end_char = min(end_candidates) if end_candidates else len(text)
+        qd_end_char = m_end.start() if m_end else len(text)
 
-    # Map char -> line
-    prefix = text[:qd_start_char]
-    qd_start_line = prefix.count('\n')
+    # Map char -> line (đếm trực tiếp trên text theo khoảng, không cắt chuỗi con)
+    qd_start_line = text.count('\n', 0, qd_start_char)
 
     # end_line là dòng TRƯỚC mốc kết thúc
-    qd_end_line = text[:qd_end_char].count('\n') - 1
+    qd_end_line = qd_start_line + text.count('\n', qd_start_char, qd_end_char) - 1
     if qd_end_line < qd_start_line:
         qd_end_line = qd_start_line  # phòng rìa
 
@@ -157,14 +168,14 @@ def extract_quyet_dinh_to_noi_nhan(lines: List[str], start_pos: int) -> Tuple[st
     i += 1
 
     # Nhận diện 'Nơi nhận' (chịu *, -, bullet •, có/không dấu, cho phép nội dung sau :)
-    noi_nhan_pat = re.compile(r'(?mi)^\s*[\*\-\u2022]?\s*N[ơo]i\s+nh[aă]n\s*:[^\n]*$')
+    noi_nhan_search = _NOI_NHAN_LINE_PAT.search
 
     while i < len(lines):
         raw_line = lines[i]
         line = raw_line.strip()
 
         # Nếu gặp 'Nơi nhận' thì dừng TRƯỚC dòng đó (không append dòng này)
-        if noi_nhan_pat.search(line):
+        if noi_nhan_search(line):
             break
 
         # Không dừng ở Điều/Chương/Phụ lục. Yêu cầu là GOM HẾT trong block Quyết định.
@@ -190,13 +201,13 @@ def extract_quyet_dinh_section(text: str, legal_basis_pattern) -> str:
     in_quyet_dinh = False
     
     for line in lines:
-        if re.search(r'^\s*QUYẾT\s*ĐỊNH', line, re.IGNORECASE):
+        if _QD_HEAD_PAT.search(line):
             in_quyet_dinh = True
             quyet_dinh_lines.append(line)
         elif in_quyet_dinh:
             # Stop at Căn cứ or first article
             if (legal_basis_pattern.search(line) or 
-                re.search(r'^\s*Điều\s+\d+', line, re.IGNORECASE)):
+                _DIEU_HEAD_PAT.search(line)):
                 break
             quyet_dinh_lines.append(line)
     